@@ -1,12 +1,135 @@
 import os
-from fastapi import FastAPI, HTTPException, Depends # type: ignore
+import secrets
+import threading
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Depends, Query, Header # type: ignore
 from fastapi.middleware.cors import CORSMiddleware # type: ignore
-from pydantic import BaseModel # type: ignore
+from fastapi.responses import JSONResponse, Response # type: ignore
+from pydantic import BaseModel, Field # type: ignore
 from typing import List, Optional
-import uvicorn # type: ignore
-from hybrid_recommender import HybridRecommender
+from response_encoder import CourseResponseEncoder
+from ranking_cache import RankingCache, StaleCursorError, encode_cursor, decode_cursor
 
-app = FastAPI(title="LMS Recommender API", description="API for course recommendations")
+class ServedModel:
+    """One built model version together with the response encoder and ranking cache that belong to it"""
+    
+    def __init__(self, recommender, encoder, rankings, version):
+        self.recommender = recommender
+        self.encoder = encoder
+        self.rankings = rankings
+        self.version = version
+
+class ModelHolder:
+    """Builds the shared recommender in a background thread so the app can serve health checks immediately.
+    
+    pandas, scikit-learn and pymongo are only imported once the build starts, which
+    keeps `import api` and worker start-up cheap. A refresh rebuilds the model in the
+    background while the current version keeps serving, then swaps in the new
+    recommender, encoder and ranking cache at once.
+    """
+    
+    def __init__(self):
+        self.served = None
+        self.version = 0
+        self.status = 'idle'
+        self.error = None
+        self.building = False
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopped = threading.Event()
+        self.refresher = None
+    
+    def start(self, refresh=False):
+        """Start a background build unless one is running; once a model is ready only a refresh rebuilds it.
+        
+        Returns whether a build was started.
+        """
+        with self.lock:
+            if self.building or (self.served is not None and not refresh):
+                return False
+            self.building = True
+            if self.served is None:
+                self.status = 'loading'
+                self.error = None
+            self.thread = threading.Thread(target=self._build, name='recommender-build', daemon=True)
+            self.thread.start()
+            return True
+    
+    def _build(self):
+        previous = self.served
+        try:
+            from hybrid_recommender import HybridRecommender
+            
+            recommender = HybridRecommender(preload=False)
+            if previous is not None:
+                # Stages whose inputs did not change are reused from memory
+                recommender.reuse_artifacts(previous.recommender)
+            if not recommender.build():
+                raise RuntimeError("No course or user data available to train the recommender")
+            
+            # Serialise every course's public payload once for this model version
+            encoder = CourseResponseEncoder(recommender.collaborative_recommender.courses_df, self.version + 1)
+            # Ranked lists are cached per model version, so a rebuild starts with an empty cache
+            rankings = RankingCache(encoder)
+        except Exception as e:
+            with self.lock:
+                self.building = False
+                self.error = str(e)
+                # A failed refresh keeps serving the previous version
+                if self.served is None:
+                    self.status = 'failed'
+            return
+        
+        with self.lock:
+            self.version += 1
+            self.served = ServedModel(recommender, encoder, rankings, self.version)
+            self.status = 'ready'
+            self.error = None
+            self.building = False
+        
+        if previous is not None:
+            previous.recommender.close()
+    
+    def start_refreshing(self, interval):
+        """Rebuild the model in the background every `interval` seconds"""
+        def refresh():
+            while not self.stopped.wait(interval):
+                self.start(refresh=True)
+        
+        self.refresher = threading.Thread(target=refresh, name='recommender-refresh', daemon=True)
+        self.refresher.start()
+    
+    def wait(self, timeout=None):
+        """Block until the current build finishes (used by eager start-up and scripts)"""
+        if self.thread is not None:
+            self.thread.join(timeout)
+        return self.status == 'ready'
+    
+    def close(self):
+        self.stopped.set()
+        if self.served is not None:
+            self.served.recommender.close()
+            self.served = None
+
+model = ModelHolder()
+
+@asynccontextmanager
+async def lifespan(app):
+    model.start()
+    
+    # MODEL_LOADING=eager blocks start-up until the model is ready, the default serves immediately
+    if os.environ.get("MODEL_LOADING", "background") == "eager":
+        model.wait()
+    
+    # MODEL_REFRESH_SECONDS > 0 periodically retrains on current data (POST /admin/refresh does it on demand)
+    refresh_seconds = float(os.environ.get("MODEL_REFRESH_SECONDS", 0))
+    if refresh_seconds > 0:
+        model.start_refreshing(refresh_seconds)
+    
+    yield
+    model.close()
+
+app = FastAPI(title="LMS Recommender API", description="API for course recommendations", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -17,17 +140,53 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Dependency to get recommender
-def get_recommender():
-    recommender = HybridRecommender()
+# Dependency to get the model version serving this request
+def get_model():
+    served = model.served
+    if served is None:
+        # Retry a failed build on the next request instead of staying down
+        if model.status == 'failed':
+            model.start()
+        raise HTTPException(status_code=503, detail="Recommender model is loading", headers={"Retry-After": "5"})
+    
+    return served
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Admin endpoints need the ADMIN_TOKEN environment variable and a matching X-Admin-Token header"""
+    token = os.environ.get("ADMIN_TOKEN")
+    if not token:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled, set ADMIN_TOKEN to enable them")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, token):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+def json_response(served, ranked, explain=False):
+    """Build the response body from pre-serialised course payloads, skipping per-request validation"""
+    return Response(content=served.encoder.encode(ranked, explain), media_type="application/json")
+
+def parse_cursor(served, key, cursor):
+    """Offset of the requested page, 0 for the first one"""
+    if cursor is None:
+        return 0
     try:
-        yield recommender
-    finally:
-        recommender.close()
+        return decode_cursor(cursor, served.version, key)
+    except StaleCursorError as e:
+        # The list was re-ranked by a newer model, continuing would repeat or skip courses
+        raise HTTPException(status_code=410, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def paginated_response(served, key, rank, offset, limit, explain=False):
+    """Serve a page of a ranked list that is computed once per model version and then sliced"""
+    ranked, next_offset = served.rankings.page(key, rank, offset, limit)
+    next_cursor = encode_cursor(next_offset, served.version, key) if next_offset is not None else None
+    return Response(
+        content=served.encoder.encode(ranked, explain, {"next_cursor": next_cursor}),
+        media_type="application/json"
+    )
 
 # Response models
 class CourseBase(BaseModel):
-    _id: str
+    id: str = Field(alias="_id")
     name: str
     description: str
     categories: Optional[str] = None
@@ -35,39 +194,108 @@ class CourseBase(BaseModel):
     level: Optional[str] = None
     ratings: Optional[float] = None
     purchased: Optional[int] = None
+    # Only included when the request sets explain=true
+    score: Optional[float] = None
+    explanation: Optional[List[str]] = None
 
 class RecommendationResponse(BaseModel):
     recommendations: List[CourseBase]
 
+class PaginatedRecommendationResponse(RecommendationResponse):
+    # Pass as `cursor` to get the next page, null on the last page
+    next_cursor: Optional[str] = None
+
+class Enrolment(BaseModel):
+    user_id: str
+    course_id: str
+
 # API routes
 @app.get("/")
 def read_root():
     return {"message": "LMS Recommender API is running"}
 
-@app.get("/recommend/user/{user_id}", response_model=RecommendationResponse)
-def recommend_for_user(user_id: str, limit: int = 5, recommender: HybridRecommender = Depends(get_recommender)):
-    """Get personalized course recommendations for a user"""
+@app.get("/ready")
+def readiness():
+    """Readiness probe: 200 once a recommender model is built, 503 while loading or after a failed first build"""
+    if model.served is not None:
+        return {"status": "ready", "version": model.version, "refreshing": model.building}
+    
+    if model.status == 'failed':
+        model.start()
+        return JSONResponse(status_code=503, content={"status": "failed", "detail": model.error})
+    
+    return JSONResponse(status_code=503, content={"status": model.status})
+
+@app.post("/admin/refresh", status_code=202, dependencies=[Depends(require_admin)])
+def refresh_model():
+    """Retrain on current data in the background; the current model keeps serving until the new one is ready"""
+    started = model.start(refresh=True)
+    return {"status": "started" if started else "already building", "version": model.version}
+
+@app.get("/recommend/user/{user_id}", response_model=PaginatedRecommendationResponse)
+def recommend_for_user(user_id: str, limit: int = Query(5, ge=1), cursor: Optional[str] = None, explain: bool = False,
+                       diversity: float = Query(0.0, ge=0.0, le=1.0), served=Depends(get_model)):
+    """Get personalized course recommendations for a user, a page at a time
+    
+    diversity > 0 trades relevance for less similar courses (maximal marginal relevance).
+    """
+    # Rounded so that near-identical values share one cached list
+    diversity = round(diversity, 2)
+    key = ('user', user_id, diversity)
+    offset = parse_cursor(served, key, cursor)
     try:
-        recommendations = recommender.recommend(user_id, limit)
-        return {"recommendations": recommendations}
+        return paginated_response(
+            served, key, lambda depth: served.recommender.rank(user_id, depth, diversity), offset, limit, explain
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/recommend/similar/{course_id}", response_model=RecommendationResponse)
-def recommend_similar(course_id: str, limit: int = 5, recommender: HybridRecommender = Depends(get_recommender)):
+def recommend_similar(course_id: str, limit: int = Query(5, ge=1), explain: bool = False, served=Depends(get_model)):
     """Get courses similar to a specified course"""
     try:
-        recommendations = recommender.recommend_similar_to_course(course_id, limit)
-        return {"recommendations": recommendations}
+        recommendations = served.recommender.rank_similar_to_course(course_id, limit)
+        return json_response(served, recommendations, explain)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/recommend/together/{course_id}", response_model=RecommendationResponse)
+def recommend_together(course_id: str, limit: int = Query(5, ge=1), explain: bool = False, served=Depends(get_model)):
+    """Get courses frequently taken together with a specified course"""
+    try:
+        recommendations = served.recommender.rank_taken_together(course_id, limit)
+        return json_response(served, recommendations, explain)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/enrolments")
+def add_enrolments(enrolments: List[Enrolment], served=Depends(get_model)):
+    """Record new enrolments in the co-enrolment index until the next retrain; unknown users and courses are rejected"""
+    try:
+        added, rejected = served.recommender.add_enrolments((enrolment.user_id, enrolment.course_id) for enrolment in enrolments)
+        return {"added": added, "rejected": [{"user_id": user_id, "course_id": course_id} for user_id, course_id in rejected]}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/recommend/next/{user_id}", response_model=PaginatedRecommendationResponse)
+def recommend_next(user_id: str, limit: int = Query(5, ge=1), cursor: Optional[str] = None, explain: bool = False,
+                   served=Depends(get_model)):
+    """Get the courses users typically take after this user's most recent course, a page at a time"""
+    key = ('next', user_id)
+    offset = parse_cursor(served, key, cursor)
+    try:
+        return paginated_response(
+            served, key, lambda depth: served.recommender.rank_next_courses(user_id, depth), offset, limit, explain
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/recommend/popular", response_model=RecommendationResponse)
-def recommend_popular(limit: int = 5, recommender: HybridRecommender = Depends(get_recommender)):
+def recommend_popular(limit: int = Query(5, ge=1), explain: bool = False, served=Depends(get_model)):
     """Get popular courses based on ratings and purchases"""
     try:
-        recommendations = recommender.recommend_popular_courses(limit)
-        return {"recommendations": recommendations}
+        recommendations = served.recommender.rank_popular_courses(limit)
+        return json_response(served, recommendations, explain)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -76,4 +304,5 @@ if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     
     # Run the API server
+    import uvicorn # type: ignore
     uvicorn.run("api:app", host="0.0.0.0", port=port, reload=True) 
\ No newline at end of file
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Measure cold-start cost of the recommender API
+
+Reports, each in a fresh interpreter:
+    - import time of `api` and of the heavy modules it used to pull in eagerly
+    - seconds from launching uvicorn until `/` answers and until `/ready` returns 200
+
+Usage:
+    python benchmark_startup.py [--runs 5] [--port 8765] [--timeout 300]
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+import urllib.request
+import urllib.error
+
+MODULES = ['api', 'hybrid_recommender', 'pandas', 'sklearn.feature_extraction.text', 'pymongo']
+
+def import_seconds(module):
+    """Wall time to import a module in a fresh interpreter, excluding interpreter start-up"""
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"import {module}; "
+        "print(time.perf_counter() - start)"
+    )
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+def http_status(url):
+    """Return the HTTP status for a GET, or None if the server is not accepting connections yet"""
+    try:
+        with urllib.request.urlopen(url, timeout=2) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, ConnectionError, OSError):
+        return None
+
+def startup_seconds(port, timeout):
+    """Launch uvicorn and time how long until the root endpoint and the readiness probe succeed"""
+    env = dict(os.environ, MODEL_LOADING='background')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'api:app', '--host', '127.0.0.1', '--port', str(port)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    start = time.perf_counter()
+    serving = ready = None
+    
+    try:
+        while time.perf_counter() - start < timeout:
+            if serving is None and http_status(f"http://127.0.0.1:{port}/") == 200:
+                serving = time.perf_counter() - start
+            if serving is not None and http_status(f"http://127.0.0.1:{port}/ready") == 200:
+                ready = time.perf_counter() - start
+                break
+            time.sleep(0.05)
+    finally:
+        process.terminate()
+        process.wait()
+    
+    return serving, ready
+
+def summarize(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return "n/a"
+    return f"median {statistics.median(values):.3f}s  min {min(values):.3f}s  max {max(values):.3f}s"
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API import time and cold start")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--skip-server', action='store_true', help="only measure import times")
+    args = parser.parse_args()
+    
+    print("===== IMPORT TIME (fresh interpreter) =====")
+    for module in MODULES:
+        print(f"{module:<36}{summarize([import_seconds(module) for _ in range(args.runs)])}")
+    
+    if args.skip_server:
+        return
+    
+    print("\n===== COLD START (uvicorn) =====")
+    serving_times, ready_times = [], []
+    for _ in range(args.runs):
+        serving, ready = startup_seconds(args.port, args.timeout)
+        serving_times.append(serving)
+        ready_times.append(ready)
+    
+    print(f"{'serving /':<36}{summarize(serving_times)}")
+    print(f"{'ready (/ready == 200)':<36}{summarize(ready_times)}")
+    
+    if any(ready is None for ready in ready_times):
+        print("Warning: the model did not become ready in time on some runs (is MongoDB reachable?)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Measure recall and latency of the IVF vector index against exact cosine search
+
+Usage:
+    python benchmark_vector_index.py                  # TF-IDF and interaction matrices from the database
+    python benchmark_vector_index.py --synthetic 20000  # random sparse matrix with the given number of rows
+
+Recall is measured against exact cosine on the original sparse vectors, so the
+row with nprobe equal to the number of lists shows the loss from SVD alone.
+"""
+
+import time
+import argparse
+import numpy as np
+from scipy import sparse
+from vector_index import SVDEmbedder, IVFIndex
+
+def load_matrices():
+    """Build the course TF-IDF and item interaction matrices the recommenders use"""
+    from content_based import ContentBasedRecommender
+    from collaborative_filtering import CollaborativeFilteringRecommender
+    
+    matrices = {}
+    
+    content_recommender = ContentBasedRecommender()
+    if content_recommender.train():
+        matrices['content (TF-IDF)'] = content_recommender.tfidf_matrix
+    content_recommender.close()
+    
+    collaborative_recommender = CollaborativeFilteringRecommender()
+    if collaborative_recommender.preprocess_data():
+        matrices['item CF (interactions)'] = sparse.csr_matrix(collaborative_recommender.interaction_matrix.T.values)
+    collaborative_recommender.close()
+    
+    return matrices
+
+def synthetic_matrix(n_rows, n_features=5000, density=0.005, n_topics=50, seed=42):
+    """Random sparse matrix with clustered rows, roughly shaped like TF-IDF"""
+    rng = np.random.default_rng(seed)
+    topics = sparse.random(n_topics, n_features, density=density * 4, random_state=seed, format='csr')
+    assignments = rng.integers(0, n_topics, n_rows)
+    noise = sparse.random(n_rows, n_features, density=density, random_state=seed + 1, format='csr')
+    return sparse.csr_matrix(topics[assignments] + noise)
+
+def exact_neighbours(matrix, queries, k):
+    """Ground-truth top-k by exact cosine on the original sparse vectors, plus per-query latency"""
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    normalized = sparse.csr_matrix(sparse.diags(1.0 / norms) @ matrix)
+    
+    results = []
+    start = time.perf_counter()
+    for q in queries:
+        scores = (normalized @ normalized[q].T).toarray().ravel()
+        scores[q] = -np.inf
+        top = np.argpartition(-scores, k - 1)[:k]
+        results.append(set(top.tolist()))
+    latency = (time.perf_counter() - start) / len(queries)
+    
+    return results, latency
+
+def benchmark(name, matrix, k=10, n_queries=200, n_components=64, nprobes=(1, 2, 4, 8, 16)):
+    """Print recall@k and mean query latency for each index configuration"""
+    n_rows = matrix.shape[0]
+    if n_rows <= k:
+        print(f"\n{name}: only {n_rows} rows, skipping")
+        return
+    
+    rng = np.random.default_rng(0)
+    queries = rng.choice(n_rows, min(n_queries, n_rows), replace=False)
+    truth, exact_latency = exact_neighbours(matrix, queries, k)
+    
+    start = time.perf_counter()
+    embeddings = SVDEmbedder(n_components).fit_transform(matrix)
+    embed_seconds = time.perf_counter() - start
+    
+    print(f"\n===== {name}: {n_rows} rows x {matrix.shape[1]} features, k={k} =====")
+    print(f"SVD to {embeddings.shape[1]} dims: {embed_seconds:.2f}s")
+    print(f"{'config':<28}{'recall@k':>10}{'ms/query':>12}{'index MB':>12}")
+    print(f"{'exact (sparse cosine)':<28}{1.0:>10.3f}{exact_latency * 1000:>12.3f}{'-':>12}")
+    
+    for quantize in (False, True):
+        start = time.perf_counter()
+        index = IVFIndex(quantize=quantize).build(embeddings)
+        build_seconds = time.perf_counter() - start
+        n_lists = len(index.centroids)
+        
+        for nprobe in sorted(set(min(p, n_lists) for p in nprobes + (n_lists,))):
+            hits = 0
+            start = time.perf_counter()
+            for q, expected in zip(queries, truth):
+                ids, _ = index.search(embeddings[q], k, nprobe=nprobe, exclude=[q])
+                hits += len(expected.intersection(ids.tolist()))
+            latency = (time.perf_counter() - start) / len(queries)
+            
+            label = f"ivf{n_lists} {'int8' if quantize else 'f32'} nprobe={nprobe}"
+            print(f"{label:<28}{hits / (k * len(queries)):>10.3f}{latency * 1000:>12.3f}{index.memory_bytes() / 1e6:>12.2f}")
+        
+        print(f"  (build {build_seconds:.2f}s)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the IVF vector index against exact cosine search")
+    parser.add_argument('--synthetic', type=int, default=0, help="use a synthetic matrix with this many rows")
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--components', type=int, default=64)
+    args = parser.parse_args()
+    
+    if args.synthetic:
+        matrices = {'synthetic': synthetic_matrix(args.synthetic)}
+    else:
+        matrices = load_matrices()
+    
+    if not matrices:
+        print("Error: No data available to benchmark.")
+        return
+    
+    for name, matrix in matrices.items():
+        benchmark(name, sparse.csr_matrix(matrix), k=args.k, n_components=args.components)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import threading
+from copy import deepcopy
+import numpy as np
+from scipy import sparse
+
+class CoEnrolmentIndex:
+    """Precomputed "frequently taken together" table.
+    
+    Co-enrolment counts come from one sparse XᵀX product over the binary
+    user x course purchase matrix. For every course only the top-K partners
+    (by lift, among pairs with at least `min_support` shared learners) are kept
+    in fixed-width arrays, so serving is an O(K) row lookup. New enrolments
+    update the counts and re-rank only the rows they touch.
+    """
+    
+    def __init__(self, top_k=20, min_support=2, sort_by='lift'):
+        self.top_k = top_k
+        self.min_support = min_support
+        self.sort_by = sort_by
+        
+        self.course_ids = []
+        self.course_positions = {}
+        self.user_courses = {}
+        # Every user in the built snapshot, purchases or not; only they can add enrolments
+        self.known_users = set()
+        self.co_counts = None
+        self.course_counts = None
+        self.n_users = 0
+        
+        # Top-K table: partner positions (-1 = empty slot), shared learner counts and
+        # affinity = count / (n_a * n_b), so lift = affinity * n_users stays exact as users join
+        self.top_ids = None
+        self.top_counts = None
+        self.top_affinity = None
+        
+        self.lock = threading.Lock()
+    
+    def build(self, users_df, course_ids):
+        """Build the index over the given courses from the users' `courses` arrays"""
+        self.course_ids = list(course_ids)
+        self.course_positions = {course_id: i for i, course_id in enumerate(self.course_ids)}
+        self.user_courses = {}
+        self.known_users = set(map(str, users_df['_id'])) if not users_df.empty else set()
+        
+        rows, cols = [], []
+        if not users_df.empty:
+            for user_id, courses in zip(users_df['_id'], users_df['courses']):
+                if not isinstance(courses, list):
+                    continue
+                positions = set(
+                    self.course_positions[str(course['courseId'])]
+                    for course in courses
+                    if 'courseId' in course and str(course['courseId']) in self.course_positions
+                )
+                if positions:
+                    row = len(self.user_courses)
+                    self.user_courses[str(user_id)] = positions
+                    rows.extend([row] * len(positions))
+                    cols.extend(positions)
+        
+        n_courses = len(self.course_ids)
+        self.n_users = len(self.user_courses)
+        purchases = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int32), (rows, cols)),
+            shape=(self.n_users, n_courses)
+        )
+        
+        # Co-enrolment counts between every pair of courses, without the diagonal
+        co_counts = (purchases.T @ purchases).tocsr()
+        co_counts.setdiag(0)
+        co_counts.eliminate_zeros()
+        self.co_counts = co_counts
+        self.course_counts = np.asarray(purchases.sum(axis=0)).ravel().astype(np.int64)
+        
+        self.top_ids = np.full((n_courses, self.top_k), -1, dtype=np.int32)
+        self.top_counts = np.zeros((n_courses, self.top_k), dtype=np.int32)
+        self.top_affinity = np.zeros((n_courses, self.top_k), dtype=np.float32)
+        for position in range(n_courses):
+            self._rank_row(position)
+        
+        return self
+    
+    def _rank_row(self, position):
+        """Recompute the top-K partners of one course from its row of co-enrolment counts"""
+        start, end = self.co_counts.indptr[position], self.co_counts.indptr[position + 1]
+        partners = self.co_counts.indices[start:end]
+        counts = self.co_counts.data[start:end]
+        
+        # Thresholding: rare pairs have unreliable lift
+        keep = counts >= self.min_support
+        partners, counts = partners[keep], counts[keep]
+        
+        # lift = P(a and b) / (P(a) P(b)) = affinity * n_users
+        expected = self.course_counts[position] * self.course_counts[partners]
+        affinity = counts / np.maximum(expected, 1).astype(np.float64)
+        
+        key = affinity if self.sort_by == 'lift' else counts
+        k = min(self.top_k, len(partners))
+        top = np.argsort(-key, kind='stable')[:k]
+        
+        self.top_ids[position] = -1
+        self.top_counts[position] = 0
+        self.top_affinity[position] = 0
+        self.top_ids[position, :k] = partners[top]
+        self.top_counts[position, :k] = counts[top]
+        self.top_affinity[position, :k] = affinity[top]
+    
+    def copy(self):
+        """Independent copy that can take new enrolments without changing this index"""
+        with self.lock:
+            return deepcopy(self)
+    
+    def add_enrolments(self, enrolments):
+        """Apply new (user_id, course_id) enrolments incrementally.
+        
+        Returns (number of new enrolments, rejected (user_id, course_id) pairs). Users and
+        courses that are not in the built snapshot are rejected rather than added, so the
+        index cannot grow and lift cannot be skewed between builds; they are picked up by
+        the next build.
+        """
+        with self.lock:
+            rows, cols = [], []
+            touched = set()
+            added = 0
+            rejected = []
+            
+            for user_id, course_id in enrolments:
+                user_id, course_id = str(user_id), str(course_id)
+                position = self.course_positions.get(course_id)
+                if position is None or user_id not in self.known_users:
+                    rejected.append((user_id, course_id))
+                    continue
+                
+                owned = self.user_courses.get(user_id)
+                if owned is None:
+                    owned = self.user_courses[user_id] = set()
+                    self.n_users += 1
+                if position in owned:
+                    continue
+                
+                for other in owned:
+                    rows.extend([position, other])
+                    cols.extend([other, position])
+                owned.add(position)
+                self.course_counts[position] += 1
+                touched.add(position)
+                added += 1
+            
+            if not added:
+                return 0, rejected
+            
+            n_courses = len(self.course_ids)
+            delta = sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)), shape=(n_courses, n_courses))
+            self.co_counts = (self.co_counts + delta).tocsr()
+            
+            # Affinity changes for every course paired with a course whose enrolment count changed
+            affected = set(touched)
+            for position in touched:
+                start, end = self.co_counts.indptr[position], self.co_counts.indptr[position + 1]
+                affected.update(self.co_counts.indices[start:end].tolist())
+            
+            for position in affected:
+                self._rank_row(position)
+            
+            return added, rejected
+    
+    def lookup(self, course_id, n_recommendations=5):
+        """Return (course_id, lift, explanation) tuples for courses frequently taken with the given one"""
+        position = self.course_positions.get(course_id)
+        if position is None:
+            return []
+        
+        with self.lock:
+            partners = self.top_ids[position, :n_recommendations]
+            counts = self.top_counts[position, :n_recommendations]
+            lift = self.top_affinity[position, :n_recommendations] * float(self.n_users)
+            
+            return [
+                (self.course_ids[partner], lift_value, [f"taken together by {count} learners", f"lift {lift_value:.2f}"])
+                for partner, count, lift_value in zip(partners.tolist(), counts.tolist(), lift.tolist())
+                if partner >= 0
+            ]
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
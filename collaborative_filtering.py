@@ -1,40 +1,62 @@
 import numpy as np
 import pandas as pd
 from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.preprocessing import StandardScaler
 from data_loader import DataLoader
+from vector_index import SVDEmbedder, IVFIndex
 
 class CollaborativeFilteringRecommender:
-    def __init__(self):
+    def __init__(self, use_vector_index=False, n_components=64, nprobe=4, quantize=False):
         self.data_loader = DataLoader()
         self.user_similarity_matrix = None
         self.item_similarity_matrix = None
         self.interaction_matrix = None
         self.courses_df = None
         self.users_df = None
+        
+        # Optional compressed item embeddings + IVF index used instead of the exact item similarity matrix
+        self.use_vector_index = use_vector_index
+        self.n_components = n_components
+        self.nprobe = nprobe
+        self.quantize = quantize
+        self.item_embeddings = None
+        self.item_index = None
     
     def preprocess_data(self):
         """Load and preprocess data"""
         # Load data
         self.courses_df = self.data_loader.load_courses()
         self.users_df = self.data_loader.load_users()
-        interactions_df = self.data_loader.create_user_item_matrix()
+        self.interaction_matrix = self.build_interaction_matrix(self.users_df, self.courses_df)
         
-        if interactions_df.empty:
-            return False
+        return self.interaction_matrix is not None
+    
+    def build_interaction_matrix(self, users_df, courses_df):
+        """Build the weighted user x course interaction matrix, or None when there is no data"""
+        if users_df.empty or courses_df.empty:
+            return None
+        
+        interactions_df = self.data_loader.create_sparse_interactions(users_df, courses_df)
         
         # Create a weighted interaction score (purchased + progress)
         interactions_df['interaction_score'] = interactions_df['purchased'] * 5 + interactions_df['progress'] * 10
         
         # Create user-item matrix
-        self.interaction_matrix = interactions_df.pivot_table(
-            index='user_id', 
-            columns='course_id', 
-            values='interaction_score',
+        if interactions_df.empty:
+            interaction_matrix = pd.DataFrame(dtype=float)
+        else:
+            interaction_matrix = interactions_df.pivot_table(
+                index='user_id', 
+                columns='course_id', 
+                values='interaction_score',
+                fill_value=0
+            )
+        
+        # Users and courses without any interaction still get a row / column of zeros
+        return interaction_matrix.reindex(
+            index=pd.Index(sorted(set(users_df['_id'])), name='user_id'),
+            columns=pd.Index(sorted(set(courses_df['_id'])), name='course_id'),
             fill_value=0
-        )
-        
-        return True
+        ).astype(float)
     
     def train_user_based(self):
         """Train user-based collaborative filtering"""
@@ -42,15 +64,17 @@ class CollaborativeFilteringRecommender:
             if not self.preprocess_data():
                 return False
         
+        self.user_similarity_matrix = self.compute_user_similarity(self.interaction_matrix)
+        return True
+    
+    def compute_user_similarity(self, interaction_matrix):
+        """Cosine similarity between users as a DataFrame"""
         # Calculate user similarity
-        self.user_similarity_matrix = cosine_similarity(self.interaction_matrix)
-        self.user_similarity_matrix = pd.DataFrame(
-            self.user_similarity_matrix,
-            index=self.interaction_matrix.index,
-            columns=self.interaction_matrix.index
+        return pd.DataFrame(
+            cosine_similarity(interaction_matrix),
+            index=interaction_matrix.index,
+            columns=interaction_matrix.index
         )
-        
-        return True
     
     def train_item_based(self):
         """Train item-based collaborative filtering"""
@@ -58,18 +82,35 @@ class CollaborativeFilteringRecommender:
             if not self.preprocess_data():
                 return False
         
+        self.load_artifacts(self.compute_item_similarity(self.interaction_matrix))
+        return True
+    
+    def compute_item_similarity(self, interaction_matrix):
+        """Item similarity model as a dict of attributes: the exact matrix or the embeddings and their index"""
+        if self.use_vector_index:
+            # Compress item interaction vectors and index them for approximate nearest-neighbour search
+            item_embeddings = SVDEmbedder(self.n_components).fit_transform(interaction_matrix.T.values)
+            return {
+                'item_similarity_matrix': None,
+                'item_embeddings': item_embeddings,
+                'item_index': IVFIndex(nprobe=self.nprobe, quantize=self.quantize).build(item_embeddings)
+            }
+        
         # Calculate item similarity
-        self.item_similarity_matrix = cosine_similarity(self.interaction_matrix.T)
-        self.item_similarity_matrix = pd.DataFrame(
-            self.item_similarity_matrix,
-            index=self.interaction_matrix.columns,
-            columns=self.interaction_matrix.columns
+        item_similarity_matrix = pd.DataFrame(
+            cosine_similarity(interaction_matrix.T),
+            index=interaction_matrix.columns,
+            columns=interaction_matrix.columns
         )
-        
-        return True
+        return {'item_similarity_matrix': item_similarity_matrix, 'item_embeddings': None, 'item_index': None}
     
-    def recommend_user_based(self, user_id, n_recommendations=5):
-        """Generate user-based recommendations"""
+    def load_artifacts(self, artifacts):
+        """Set trained state (e.g. from the training pipeline) without recomputing it"""
+        for name, value in artifacts.items():
+            setattr(self, name, value)
+    
+    def rank_user_based(self, user_id, n_recommendations=5):
+        """Return (course_id, score, None) tuples from user-based collaborative filtering, best first"""
         if self.user_similarity_matrix is None:
             self.train_user_based()
         
@@ -102,18 +143,21 @@ class CollaborativeFilteringRecommender:
         sorted_recommendations = sorted(recommendations.items(), key=lambda x: x[1], reverse=True)
         
         # Return top n recommendations
-        top_recommendations = [course_id for course_id, _ in sorted_recommendations[:n_recommendations]]
-        
-        # Get course details
-        if not self.courses_df.empty:
-            recommended_courses = self.courses_df[self.courses_df['_id'].isin(top_recommendations)]
-            return recommended_courses.to_dict('records')
-        
-        return top_recommendations
+        return [(course_id, float(score), None) for course_id, score in sorted_recommendations[:n_recommendations]]
     
-    def recommend_item_based(self, user_id, n_recommendations=5):
-        """Generate item-based recommendations"""
-        if self.item_similarity_matrix is None:
+    def _similar_items(self, course, n_items=10):
+        """Return (course_id, similarity) pairs for the most similar courses, excluding the course itself"""
+        if self.item_index is None:
+            similar = self.item_similarity_matrix[course].sort_values(ascending=False)[1:n_items+1]
+            return list(similar.items())
+        
+        position = self.interaction_matrix.columns.get_loc(course)
+        ids, scores = self.item_index.search(self.item_embeddings[position], n_items, exclude=[position])
+        return list(zip(self.interaction_matrix.columns[ids], scores.tolist()))
+    
+    def rank_item_based(self, user_id, n_recommendations=5):
+        """Return (course_id, score, None) tuples from item-based collaborative filtering, best first"""
+        if self.item_similarity_matrix is None and self.item_index is None:
             self.train_item_based()
         
         if user_id not in self.interaction_matrix.index:
@@ -132,15 +176,14 @@ class CollaborativeFilteringRecommender:
         # For each course the user has interacted with
         for course in user_courses:
             # Get similar courses
-            similar_courses = self.item_similarity_matrix[course].sort_values(ascending=False).index[1:11]  # Top 10 similar courses
+            similar_courses = self._similar_items(course, 10)  # Top 10 similar courses
             
-            for similar_course in similar_courses:
+            for similar_course, similarity in similar_courses:
                 if similar_course not in user_courses:
                     if similar_course not in recommendations:
                         recommendations[similar_course] = 0
                     
                     # Weight by similarity and user's interaction score
-                    similarity = self.item_similarity_matrix.loc[course, similar_course]
                     interaction_score = user_interactions[course]
                     recommendations[similar_course] += similarity * interaction_score
         
@@ -148,12 +191,24 @@ class CollaborativeFilteringRecommender:
         sorted_recommendations = sorted(recommendations.items(), key=lambda x: x[1], reverse=True)
         
         # Return top n recommendations
-        top_recommendations = [course_id for course_id, _ in sorted_recommendations[:n_recommendations]]
+        return [(course_id, float(score), None) for course_id, score in sorted_recommendations[:n_recommendations]]
+    
+    def recommend_user_based(self, user_id, n_recommendations=5):
+        """Generate user-based recommendations"""
+        return self.course_records(self.rank_user_based(user_id, n_recommendations))
+    
+    def recommend_item_based(self, user_id, n_recommendations=5):
+        """Generate item-based recommendations"""
+        return self.course_records(self.rank_item_based(user_id, n_recommendations))
+    
+    def course_records(self, ranked):
+        """Course rows as dicts, in the order of the ranked (course_id, ...) tuples"""
+        top_recommendations = [item[0] for item in ranked]
         
         # Get course details
         if not self.courses_df.empty:
-            recommended_courses = self.courses_df[self.courses_df['_id'].isin(top_recommendations)]
-            return recommended_courses.to_dict('records')
+            positions = pd.Index(self.courses_df['_id']).get_indexer(top_recommendations)
+            return self.courses_df.iloc[positions[positions >= 0]].to_dict('records')
         
         return top_recommendations
     
@@ -3,14 +3,29 @@ import pandas as pd
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 from data_loader import DataLoader
+from content_ingestion import ContentIngestor
+from vector_index import SVDEmbedder, IVFIndex, normalize_rows
+from diversity import mmr_rerank, pool_size
 
 class ContentBasedRecommender:
-    def __init__(self):
+    def __init__(self, use_vector_index=False, n_components=64, nprobe=4, quantize=False):
         self.data_loader = DataLoader()
         self.courses_df = None
         self.tfidf_matrix = None
         self.course_indices = None
         self.similarity_matrix = None
+        self.users_df = None
+        
+        # Optional compressed embeddings + IVF index used instead of the exact similarity matrix
+        self.use_vector_index = use_vector_index
+        self.n_components = n_components
+        self.nprobe = nprobe
+        self.quantize = quantize
+        self.embeddings = None
+        self.vector_index = None
+        
+        # L2-normalised one-hot main topics per course, used to diversify recommendations
+        self.topic_vectors = None
         
         # Define related technology mapping for better recommendations
         self.tech_relationships = {
@@ -34,6 +49,9 @@ class ContentBasedRecommender:
             'tool': 1.3,
             'concept': 1.2
         }
+        
+        # Incremental, cached extraction of course text features
+        self.content_ingestor = ContentIngestor(self.data_loader, self.extract_content_features, self.tech_relationships)
     
     def preprocess_data(self):
         """Load and preprocess data"""
@@ -42,126 +60,138 @@ class ContentBasedRecommender:
         if self.courses_df.empty:
             return False
         
-        # Create content features for each course
-        self.courses_df['content_features'] = ''
-        self.courses_df['main_topics'] = ''
+        self.courses_df = self.attach_content_features(self.courses_df)
+        return True
+    
+    def attach_content_features(self, courses_df):
+        """Return a copy of the catalogue with 'content_features' and 'main_topics' columns"""
+        # Combine name, categories, tags, level, description, benefits, prerequisites, and course content for feature extraction.
+        # The ingestor streams the text fields and only re-extracts courses that changed since the last run.
+        features = self.content_ingestor.ingest()
         
-        # Combine name, categories, tags, level, description, benefits, prerequisites, and course content for feature extraction
-        for idx, row in self.courses_df.iterrows():
-            content = []
-            main_topics = set()
+        courses_df = courses_df.copy()
+        courses_df['content_features'] = courses_df['_id'].map(
+            lambda course_id: features.get(course_id, {}).get('content_features', '')
+        )
+        courses_df['main_topics'] = courses_df['_id'].map(
+            lambda course_id: features.get(course_id, {}).get('main_topics', '')
+        )
+        
+        return courses_df
+    
+    def extract_content_features(self, course):
+        """Build the weighted feature text and main topics for a single course document"""
+        content = []
+        main_topics = set()
+        
+        # Process course name with extra weight
+        if 'name' in course and course['name']:
+            course_name = str(course['name']).lower()
+            content.append(str(course['name']) + ' ' + str(course['name']))  # Add twice for more weight
             
-            # Process course name with extra weight
-            if 'name' in row and row['name']:
-                course_name = str(row['name']).lower()
-                content.append(str(row['name']) + ' ' + str(row['name']))  # Add twice for more weight
-                
-                # Identify main technology topics in the course name
-                for tech, related in self.tech_relationships.items():
-                    if tech in course_name:
+            # Identify main technology topics in the course name
+            for tech, related in self.tech_relationships.items():
+                if tech in course_name:
+                    main_topics.add(tech)
+                for rel_tech in related:
+                    if rel_tech in course_name:
                         main_topics.add(tech)
-                    for rel_tech in related:
-                        if rel_tech in course_name:
-                            main_topics.add(tech)
-                            main_topics.add(rel_tech)
+                        main_topics.add(rel_tech)
+        
+        if 'categories' in course and course['categories']:
+            categories = str(course['categories']).lower()
+            content.append(str(course['categories']))
             
-            if 'categories' in row and row['categories']:
-                categories = str(row['categories']).lower()
-                content.append(str(row['categories']))
-                
-                # Extract main topics from categories
-                for tech in self.tech_relationships:
-                    if tech in categories:
-                        main_topics.add(tech)
+            # Extract main topics from categories
+            for tech in self.tech_relationships:
+                if tech in categories:
+                    main_topics.add(tech)
+        
+        if 'tags' in course and course['tags']:
+            tags = str(course['tags']).lower()
+            content.append(str(course['tags']))
             
-            if 'tags' in row and row['tags']:
-                tags = str(row['tags']).lower()
-                content.append(str(row['tags']))
-                
-                # Extract main topics from tags
-                for tech in self.tech_relationships:
-                    if tech in tags:
+            # Extract main topics from tags
+            for tech in self.tech_relationships:
+                if tech in tags:
+                    main_topics.add(tech)
+                    
+                # Check for related technologies
+                for rel_tech in self.tech_relationships.get(tech, []):
+                    if rel_tech in tags:
                         main_topics.add(tech)
-                        
-                    # Check for related technologies
-                    for rel_tech in self.tech_relationships.get(tech, []):
-                        if rel_tech in tags:
-                            main_topics.add(tech)
-                            main_topics.add(rel_tech)
+                        main_topics.add(rel_tech)
+        
+        if 'level' in course and course['level']:
+            content.append(str(course['level']))
             
-            if 'level' in row and row['level']:
-                content.append(str(row['level']))
-                
-            if 'description' in row and row['description']:
-                description = str(row['description']).lower()
-                content.append(str(row['description']))
+        if 'description' in course and course['description']:
+            description = str(course['description']).lower()
+            content.append(str(course['description']))
+            
+            # Extract main topics from description
+            for tech in self.tech_relationships:
+                if tech in description:
+                    main_topics.add(tech)
+        
+        # Add benefits
+        if 'benefits' in course and isinstance(course['benefits'], list):
+            benefits_text = ' '.join([str(benefit.get('title', '')) for benefit in course['benefits'] if isinstance(benefit, dict) and 'title' in benefit])
+            if benefits_text:
+                content.append(benefits_text)
+        
+        # Add prerequisites
+        if 'prerequisites' in course and isinstance(course['prerequisites'], list):
+            prereq_text = ' '.join([str(prereq.get('title', '')) for prereq in course['prerequisites'] if isinstance(prereq, dict) and 'title' in prereq])
+            if prereq_text:
+                content.append(prereq_text)
                 
-                # Extract main topics from description
+                # Extract main topics from prerequisites
+                prereq_lower = prereq_text.lower()
                 for tech in self.tech_relationships:
-                    if tech in description:
+                    if tech in prereq_lower:
                         main_topics.add(tech)
+        
+        # Add course data details
+        if 'courseData' in course and isinstance(course['courseData'], list):
+            lesson_text = []
+            for lesson in course['courseData']:
+                if isinstance(lesson, dict):
+                    if 'title' in lesson and lesson['title']:
+                        lesson_text.append(str(lesson['title']))
+                    if 'description' in lesson and lesson['description']:
+                        lesson_text.append(str(lesson['description']))
+                    if 'videoSection' in lesson and lesson['videoSection']:
+                        lesson_text.append(str(lesson['videoSection']))
+                    if 'suggestion' in lesson and lesson['suggestion']:
+                        lesson_text.append(str(lesson['suggestion']))
             
-            # Add benefits
-            if 'benefits' in row and isinstance(row['benefits'], list):
-                benefits_text = ' '.join([str(benefit.get('title', '')) for benefit in row['benefits'] if isinstance(benefit, dict) and 'title' in benefit])
-                if benefits_text:
-                    content.append(benefits_text)
+            full_lesson_text = ' '.join(lesson_text).lower()
+            content.append(' '.join(lesson_text))
             
-            # Add prerequisites
-            if 'prerequisites' in row and isinstance(row['prerequisites'], list):
-                prereq_text = ' '.join([str(prereq.get('title', '')) for prereq in row['prerequisites'] if isinstance(prereq, dict) and 'title' in prereq])
-                if prereq_text:
-                    content.append(prereq_text)
+            # Extract main topics from lesson content
+            for tech in self.tech_relationships:
+                if tech in full_lesson_text:
+                    main_topics.add(tech)
                     
-                    # Extract main topics from prerequisites
-                    prereq_lower = prereq_text.lower()
-                    for tech in self.tech_relationships:
-                        if tech in prereq_lower:
-                            main_topics.add(tech)
-            
-            # Add course data details
-            if 'courseData' in row and isinstance(row['courseData'], list):
-                lesson_text = []
-                for lesson in row['courseData']:
-                    if isinstance(lesson, dict):
-                        if 'title' in lesson and lesson['title']:
-                            lesson_text.append(str(lesson['title']))
-                        if 'description' in lesson and lesson['description']:
-                            lesson_text.append(str(lesson['description']))
-                        if 'videoSection' in lesson and lesson['videoSection']:
-                            lesson_text.append(str(lesson['videoSection']))
-                        if 'suggestion' in lesson and lesson['suggestion']:
-                            lesson_text.append(str(lesson['suggestion']))
-                
-                full_lesson_text = ' '.join(lesson_text).lower()
-                content.append(' '.join(lesson_text))
-                
-                # Extract main topics from lesson content
-                for tech in self.tech_relationships:
-                    if tech in full_lesson_text:
+                # Check for related technologies in lessons
+                for rel_tech in self.tech_relationships.get(tech, []):
+                    if rel_tech in full_lesson_text:
                         main_topics.add(tech)
-                        
-                    # Check for related technologies in lessons
-                    for rel_tech in self.tech_relationships.get(tech, []):
-                        if rel_tech in full_lesson_text:
-                            main_topics.add(tech)
-                            main_topics.add(rel_tech)
-            
-            # Enhance content features with main topics
-            if main_topics:
-                # Add main topics with boosted weight
-                for topic in main_topics:
-                    # Add the topic multiple times to increase its weight
-                    content.append(topic + ' ' + topic + ' ' + topic)
-                    
-                    # Add related technologies
-                    for related in self.tech_relationships.get(topic, []):
-                        content.append(related)
-            
-            self.courses_df.at[idx, 'content_features'] = ' '.join(content)
-            self.courses_df.at[idx, 'main_topics'] = ','.join(main_topics)
+                        main_topics.add(rel_tech)
         
-        return True
+        # Enhance content features with main topics
+        if main_topics:
+            # Add main topics with boosted weight
+            for topic in sorted(main_topics):
+                # Add the topic multiple times to increase its weight
+                content.append(topic + ' ' + topic + ' ' + topic)
+                
+                # Add related technologies
+                for related in self.tech_relationships.get(topic, []):
+                    content.append(related)
+        
+        return ' '.join(content), ','.join(sorted(main_topics))
     
     def train(self):
         """Train the content-based recommender"""
@@ -169,25 +199,60 @@ class ContentBasedRecommender:
             if not self.preprocess_data():
                 return False
         
-        # Create TF-IDF matrix for course features
-        tfidf = TfidfVectorizer(stop_words='english')
-        
         try:
-            self.tfidf_matrix = tfidf.fit_transform(self.courses_df['content_features'])
+            self.tfidf_matrix = self.fit_tfidf(self.courses_df)
         except:
             return False
         
+        self.load_artifacts(self.compute_similarity(self.tfidf_matrix))
+        return True
+    
+    def fit_tfidf(self, courses_df):
+        """Vectorise the course content features"""
+        # Create TF-IDF matrix for course features
+        tfidf = TfidfVectorizer(stop_words='english')
+        return tfidf.fit_transform(courses_df['content_features'])
+    
+    def compute_similarity(self, tfidf_matrix):
+        """Similarity model as a dict of attributes: the exact matrix or the embeddings and their index"""
+        if self.use_vector_index:
+            # Compress TF-IDF vectors and index them for approximate nearest-neighbour search
+            embeddings = SVDEmbedder(self.n_components).fit_transform(tfidf_matrix)
+            return {
+                'similarity_matrix': None,
+                'embeddings': embeddings,
+                'vector_index': IVFIndex(nprobe=self.nprobe, quantize=self.quantize).build(embeddings)
+            }
+        
         # Calculate cosine similarity between courses
-        self.similarity_matrix = cosine_similarity(self.tfidf_matrix, self.tfidf_matrix)
+        return {'similarity_matrix': cosine_similarity(tfidf_matrix, tfidf_matrix), 'embeddings': None, 'vector_index': None}
+    
+    def load_artifacts(self, artifacts):
+        """Set trained state (e.g. from the training pipeline) without recomputing it"""
+        for name, value in artifacts.items():
+            setattr(self, name, value)
         
         # Create course indices mapping for faster lookup
-        self.course_indices = pd.Series(self.courses_df.index, index=self.courses_df['_id']).drop_duplicates()
+        if self.courses_df is not None:
+            self.course_indices = pd.Series(self.courses_df.index, index=self.courses_df['_id']).drop_duplicates()
+            
+            if 'main_topics' in self.courses_df.columns:
+                topics = self.courses_df['main_topics'].fillna('').str.get_dummies(sep=',')
+                self.topic_vectors = normalize_rows(topics.to_numpy(dtype=np.float32))
+    
+    def _similarity_candidates(self, idx, n_recommendations):
+        """Return (course index, similarity) pairs for a course, including the course itself"""
+        if self.vector_index is None:
+            return list(enumerate(self.similarity_matrix[idx]))
         
-        return True
+        # Over-fetch so the topic boost below still has room to reorder candidates
+        n_candidates = max(50, n_recommendations * 4) + 1
+        ids, scores = self.vector_index.search(self.embeddings[idx], n_candidates)
+        return list(zip(ids.tolist(), scores.tolist()))
     
-    def recommend_similar_courses(self, course_id, n_recommendations=5):
-        """Recommend courses similar to a given course"""
-        if self.similarity_matrix is None:
+    def rank_similar_courses(self, course_id, n_recommendations=5):
+        """Return (course_id, similarity, matching_topics) tuples for courses similar to a given course, best first"""
+        if self.course_indices is None:
             self.train()
             
         if course_id not in self.course_indices.index:
@@ -201,7 +266,7 @@ class ContentBasedRecommender:
         source_topics = source_course.get('main_topics', '').split(',') if 'main_topics' in source_course else []
         
         # Get similarity scores for the course
-        similarity_scores = list(enumerate(self.similarity_matrix[idx]))
+        similarity_scores = self._similarity_candidates(idx, n_recommendations)
         
         # Apply topic-based boosting to similarity scores
         if source_topics:
@@ -222,31 +287,38 @@ class ContentBasedRecommender:
         # Sort courses by similarity
         similarity_scores = sorted(similarity_scores, key=lambda x: x[1], reverse=True)
         
-        # Get top similar courses (excluding itself)
-        similar_course_indices = [i[0] for i in similarity_scores[1:n_recommendations+1]]
+        # Get top similar courses (excluding itself) with the topics they share with the source course
+        source_topics_set = set(topic for topic in source_topics if topic)
+        ranked = []
+        for course_idx, score in similarity_scores[1:n_recommendations+1]:
+            target_topics = self.courses_df.iloc[course_idx].get('main_topics', '').split(',')
+            matching_topics = list(source_topics_set.intersection(target_topics))
+            ranked.append((self.courses_df.iloc[course_idx]['_id'], float(score), matching_topics))
         
-        # Return recommended course details
-        recommended_courses = self.courses_df.iloc[similar_course_indices].to_dict('records')
+        return ranked
+    
+    def recommend_similar_courses(self, course_id, n_recommendations=5):
+        """Recommend courses similar to a given course"""
+        ranked = self.rank_similar_courses(course_id, n_recommendations)
         
-        # Add similarity score and topic match info to recommendations
-        for i, idx in enumerate(similar_course_indices):
-            recommended_courses[i]['similarity_score'] = similarity_scores[i+1][1]
-            
-            # Add information about matching topics
-            source_topics_set = set(source_topics)
-            target_topics = self.courses_df.iloc[idx].get('main_topics', '').split(',')
-            matching_topics = source_topics_set.intersection(set(target_topics))
-            recommended_courses[i]['matching_topics'] = list(matching_topics)
+        # Return recommended course details with similarity score and topic match info
+        recommended_courses = self.course_records(ranked)
+        for course, (_, score, matching_topics) in zip(recommended_courses, ranked):
+            course['similarity_score'] = score
+            course['matching_topics'] = matching_topics
             
         return recommended_courses
     
-    def recommend_for_user(self, user_id, n_recommendations=5):
-        """Recommend courses for a user based on their previous purchases"""
-        if self.similarity_matrix is None:
+    def rank_for_user(self, user_id, n_recommendations=5, diversity=0.0):
+        """Return (course_id, score, matching_topics) tuples for a user based on their previous purchases, best first"""
+        if self.course_indices is None:
             self.train()
         
-        # Get user data
-        users_df = self.data_loader.load_users()
+        if diversity > 0:
+            return self.diversify(self.rank_for_user(user_id, pool_size(n_recommendations)), n_recommendations, diversity)
+        
+        # Get user data (the snapshot loaded with the model when available)
+        users_df = self.users_df if self.users_df is not None else self.data_loader.load_users()
         
         if users_df.empty:
             return []
@@ -274,35 +346,26 @@ class ContentBasedRecommender:
         
         for course_id in purchased_courses:
             if course_id in self.course_indices.index:
-                similar_courses = self.recommend_similar_courses(course_id, 10)  # Get more recommendations per course
+                similar_courses = self.rank_similar_courses(course_id, 10)  # Get more recommendations per course
                 
-                # Get source course main topics
-                source_idx = self.course_indices[course_id]
-                source_course = self.courses_df.iloc[source_idx]
-                source_topics = source_course.get('main_topics', '').split(',') if 'main_topics' in source_course else []
-                
-                for similar_course in similar_courses:
-                    similar_id = similar_course['_id']
+                for similar_id, similarity, matching_topics in similar_courses:
                     if similar_id not in purchased_courses:
                         if similar_id not in course_scores:
                             course_scores[similar_id] = 0
                             course_topics[similar_id] = set()
                         
-                        # Add similarity score
-                        similarity = similar_course['similarity_score']
-                        
                         # Apply rating as a weight if available
                         rating_weight = 1.0
-                        course_row = self.courses_df[self.courses_df['_id'] == similar_id]
-                        if not course_row.empty and 'ratings' in course_row.iloc[0] and course_row.iloc[0]['ratings']:
-                            rating = float(course_row.iloc[0]['ratings'])
+                        course_row = self.courses_df.iloc[self.course_indices[similar_id]]
+                        if 'ratings' in course_row and course_row['ratings']:
+                            rating = float(course_row['ratings'])
                             rating_weight = 1.0 + (rating / 5.0) * 0.5  # Ratings boost up to 50%
                         
                         # Topic match boost
                         topic_weight = 1.0
-                        if 'matching_topics' in similar_course and similar_course['matching_topics']:
-                            course_topics[similar_id].update(similar_course['matching_topics'])
-                            topic_weight = 1.0 + (len(similar_course['matching_topics']) * 0.2)  # 20% boost per matching topic
+                        if matching_topics:
+                            course_topics[similar_id].update(matching_topics)
+                            topic_weight = 1.0 + (len(matching_topics) * 0.2)  # 20% boost per matching topic
                         
                         course_scores[similar_id] += similarity * rating_weight * topic_weight
         
@@ -310,19 +373,52 @@ class ContentBasedRecommender:
         sorted_courses = sorted(course_scores.items(), key=lambda x: x[1], reverse=True)
         
         # Get top n recommendations
-        top_recommendations = [course_id for course_id, _ in sorted_courses[:n_recommendations]]
+        return [
+            (course_id, float(score), list(course_topics[course_id]))
+            for course_id, score in sorted_courses[:n_recommendations]
+        ]
+    
+    def diversity_vectors(self, course_ids):
+        """Unit vectors whose dot products are the similarity between courses: embeddings if indexed, else main topics"""
+        base = self.embeddings if self.embeddings is not None else self.topic_vectors
+        if base is None:
+            base = np.zeros((len(self.courses_df), 1), dtype=np.float32)
+        positions = self.course_indices.reindex(course_ids)
+        known = positions.notna().to_numpy()
         
-        # Get course details
-        recommended_courses = self.courses_df[self.courses_df['_id'].isin(top_recommendations)].copy()
+        # Courses without content features are not similar to anything
+        vectors = np.zeros((len(course_ids), base.shape[1]), dtype=np.float32)
+        vectors[known] = base[positions[known].astype(int).to_numpy()]
+        return vectors
+    
+    def diversify(self, ranked, n_recommendations=5, diversity=0.3):
+        """Re-rank (course_id, score, explanation) tuples by maximal marginal relevance and keep the top n"""
+        if not ranked:
+            return []
+        
+        vectors = self.diversity_vectors([item[0] for item in ranked])
+        order = mmr_rerank([item[1] for item in ranked], vectors, n_recommendations, diversity)
+        return [ranked[i] for i in order]
+    
+    def recommend_for_user(self, user_id, n_recommendations=5, diversity=0.0):
+        """Recommend courses for a user based on their previous purchases"""
+        ranked = self.rank_for_user(user_id, n_recommendations, diversity)
         
-        # Add matching topics information to recommendations
-        for i, course_id in enumerate(top_recommendations):
-            if i < len(recommended_courses) and course_id in course_topics:
-                idx = recommended_courses[recommended_courses['_id'] == course_id].index[0]
-                recommended_courses.at[idx, 'matching_topics'] = list(course_topics[course_id])
-                recommended_courses.at[idx, 'recommendation_score'] = course_scores[course_id]
+        # Get course details with matching topics information
+        recommended_courses = self.course_records(ranked)
+        for course, (_, score, matching_topics) in zip(recommended_courses, ranked):
+            course['matching_topics'] = matching_topics
+            course['recommendation_score'] = score
                 
-        return recommended_courses.to_dict('records')
+        return recommended_courses
+    
+    def course_records(self, ranked):
+        """Course rows as dicts, in the order of the ranked (course_id, ...) tuples"""
+        if not ranked:
+            return []
+        
+        positions = [self.course_indices[item[0]] for item in ranked]
+        return self.courses_df.iloc[positions].to_dict('records')
     
     def close(self):
         """Close data loader connection"""
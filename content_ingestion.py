@@ -0,0 +1,124 @@
+import os
+import json
+import hashlib
+import tempfile
+
+class ContentIngestor:
+    """Change-aware ingestion of course text for the content-based recommender.
+    
+    Lesson text (courseData), benefits and prerequisites are the richest content
+    signal but also the most expensive to load and tokenise. The ingestor streams
+    only the fields it needs, fingerprints each course's text inputs, and keeps a
+    persistent per-course cache of the extracted features so that only new or
+    changed courses are re-processed on each run.
+    """
+    
+    TEXT_FIELDS = ['name', 'description', 'categories', 'tags', 'level', 'benefits', 'prerequisites', 'courseData']
+    CACHE_FORMAT = 1
+    
+    def __init__(self, data_loader, extractor, tech_relationships=None, cache_path=None, batch_size=100):
+        self.data_loader = data_loader
+        self.extractor = extractor
+        self.cache_path = cache_path or os.getenv('CONTENT_CACHE_PATH', os.path.join('cache', 'content_features.json'))
+        self.batch_size = batch_size
+        
+        # Changing the topic mapping changes the extracted features, so it is part of the cache key
+        self.extractor_version = self._fingerprint(tech_relationships or {})
+        
+        # Counters from the last ingest run, useful for logging and benchmarks
+        self.stats = {'total': 0, 'reused': 0, 'extracted': 0, 'removed': 0}
+    
+    def _fingerprint(self, value):
+        """Stable hash of a JSON-serialisable value"""
+        payload = json.dumps(value, sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+    
+    def load_cache(self):
+        """Load the persistent feature cache, discarding it if it was built by a different extractor"""
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        
+        if cache.get('format') != self.CACHE_FORMAT or cache.get('extractor_version') != self.extractor_version:
+            return {}
+        
+        return cache.get('courses', {})
+    
+    def save_cache(self, courses):
+        """Atomically write the feature cache to disk"""
+        cache_dir = os.path.dirname(self.cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        
+        # A unique temp file per writer, so workers starting together never replace each other's file
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir or '.', prefix=os.path.basename(self.cache_path) + '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'format': self.CACHE_FORMAT,
+                    'extractor_version': self.extractor_version,
+                    'courses': courses
+                }, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    
+    def ingest(self):
+        """Return {course_id: {'content_features', 'main_topics'}} for every course, re-extracting only changed ones"""
+        cached = self.load_cache()
+        courses = {}
+        stale_ids = []
+        reused = 0
+        
+        # First pass: only ids and modification times, so unchanged courses never pull their lesson text
+        for course in self.data_loader.stream_courses(['_id', 'updatedAt'], batch_size=self.batch_size):
+            course_id = str(course['_id'])
+            updated_at = course.get('updatedAt')
+            updated_at = str(updated_at) if updated_at is not None else None
+            entry = cached.get(course_id)
+            
+            if entry is not None and updated_at is not None and entry.get('updated_at') == updated_at:
+                courses[course_id] = entry
+                reused += 1
+            else:
+                stale_ids.append(course['_id'])
+        
+        # Second pass: stream the text fields for courses that may have changed and compare content hashes
+        extracted = 0
+        for start in range(0, len(stale_ids), self.batch_size):
+            query = {'_id': {'$in': stale_ids[start:start + self.batch_size]}}
+            for course in self.data_loader.stream_courses(['_id', 'updatedAt'] + self.TEXT_FIELDS, query, self.batch_size):
+                course_id = str(course['_id'])
+                updated_at = course.get('updatedAt')
+                content_hash = self._fingerprint({field: course.get(field) for field in self.TEXT_FIELDS})
+                entry = cached.get(course_id)
+                
+                if entry is not None and entry.get('hash') == content_hash:
+                    reused += 1
+                else:
+                    content_features, main_topics = self.extractor(course)
+                    entry = {
+                        'hash': content_hash,
+                        'content_features': content_features,
+                        'main_topics': main_topics
+                    }
+                    extracted += 1
+                
+                entry['updated_at'] = str(updated_at) if updated_at is not None else None
+                courses[course_id] = entry
+        
+        self.stats = {
+            'total': len(courses),
+            'reused': reused,
+            'extracted': extracted,
+            'removed': len(set(cached) - set(courses))
+        }
+        
+        # Only rewrite the cache when something actually changed
+        if stale_ids or self.stats['removed']:
+            self.save_cache(courses)
+        
+        return courses
@@ -23,18 +23,29 @@ class DataLoader:
         except Exception as e:
             return False, f"Failed to connect to MongoDB: {str(e)}"
     
+    COURSE_FIELDS = ['_id', 'name', 'description', 'categories', 'tags', 'level', 'ratings', 'purchased']
+    
     def load_courses(self):
         """Load courses from the database"""
-        courses = list(self.db.courses.find({}))
+        courses = list(self.db.courses.find({}, {field: 1 for field in self.COURSE_FIELDS}))
         courses_df = pd.DataFrame(courses)
         
         # Extract relevant features
         if not courses_df.empty:
-            courses_df = courses_df[['_id', 'name', 'description', 'categories', 'tags', 'level', 'ratings', 'purchased']]
+            courses_df = courses_df[self.COURSE_FIELDS]
             courses_df['_id'] = courses_df['_id'].astype(str)
         
         return courses_df
     
+    def stream_courses(self, fields, query=None, batch_size=100):
+        """Iterate over raw course documents, fetching only the given fields"""
+        cursor = self.db.courses.find(query or {}, {field: 1 for field in fields}, batch_size=batch_size)
+        try:
+            for course in cursor:
+                yield course
+        finally:
+            cursor.close()
+    
     def load_users(self):
         """Load users from the database"""
         users = list(self.db.users.find({}))
@@ -47,10 +58,34 @@ class DataLoader:
         
         return users_df
     
-    def create_user_item_matrix(self):
-        """Create user-item interaction matrix"""
-        users_df = self.load_users()
-        courses_df = self.load_courses()
+    @staticmethod
+    def extract_user_interactions(user):
+        """Return (purchased course ids, {course_id: completion ratio}) for a user document or row"""
+        # Extract purchased courses
+        purchased_courses = []
+        if 'courses' in user and user['courses'] is not None:
+            for course in user['courses']:
+                if 'courseId' in course:
+                    purchased_courses.append(str(course['courseId']))
+        
+        # Extract progress data
+        progress_data = {}
+        if 'progress' in user and user['progress'] is not None:
+            for progress in user['progress']:
+                if 'courseId' in progress and 'chapters' in progress:
+                    course_id = str(progress['courseId'])
+                    completed_chapters = sum(1 for chapter in progress['chapters'] if chapter.get('isCompleted', False))
+                    total_chapters = len(progress['chapters'])
+                    
+                    if total_chapters > 0:
+                        progress_data[course_id] = completed_chapters / total_chapters
+        
+        return purchased_courses, progress_data
+    
+    def create_user_item_matrix(self, users_df=None, courses_df=None):
+        """Create user-item interaction matrix (pass already loaded frames to avoid reloading them)"""
+        users_df = self.load_users() if users_df is None else users_df
+        courses_df = self.load_courses() if courses_df is None else courses_df
         
         # Initialize the matrix
         interactions = []
@@ -58,25 +93,7 @@ class DataLoader:
         if not users_df.empty and not courses_df.empty:
             for _, user in users_df.iterrows():
                 user_id = str(user['_id'])
-                
-                # Extract purchased courses
-                purchased_courses = []
-                if 'courses' in user and user['courses'] is not None:
-                    for course in user['courses']:
-                        if 'courseId' in course:
-                            purchased_courses.append(str(course['courseId']))
-                
-                # Extract progress data
-                progress_data = {}
-                if 'progress' in user and user['progress'] is not None:
-                    for progress in user['progress']:
-                        if 'courseId' in progress and 'chapters' in progress:
-                            course_id = str(progress['courseId'])
-                            completed_chapters = sum(1 for chapter in progress['chapters'] if chapter.get('isCompleted', False))
-                            total_chapters = len(progress['chapters'])
-                            
-                            if total_chapters > 0:
-                                progress_data[course_id] = completed_chapters / total_chapters
+                purchased_courses, progress_data = self.extract_user_interactions(user)
                 
                 # Create interaction records
                 for course_id in courses_df['_id']:
@@ -90,6 +107,28 @@ class DataLoader:
         
         return pd.DataFrame(interactions)
     
+    def create_sparse_interactions(self, users_df, courses_df):
+        """Like create_user_item_matrix, but only the (user, course) pairs with a purchase or progress"""
+        interactions = []
+        
+        if not users_df.empty and not courses_df.empty:
+            known_courses = set(courses_df['_id'])
+            
+            for user in users_df.to_dict('records'):
+                user_id = str(user['_id'])
+                purchased_courses, progress_data = self.extract_user_interactions(user)
+                purchased_set = set(purchased_courses)
+                
+                for course_id in purchased_set.union(progress_data).intersection(known_courses):
+                    interactions.append({
+                        'user_id': user_id,
+                        'course_id': course_id,
+                        'purchased': 1 if course_id in purchased_set else 0,
+                        'progress': progress_data.get(course_id, 0)
+                    })
+        
+        return pd.DataFrame(interactions, columns=['user_id', 'course_id', 'purchased', 'progress'])
+    
     def close(self):
         """Close the MongoDB connection"""
         if self.client:
@@ -0,0 +1,40 @@
+import numpy as np
+
+# Largest candidate pool re-ranked for diversity
+MAX_POOL_SIZE = 500
+
+def pool_size(n_recommendations):
+    """How many relevance-ranked candidates to re-rank for a list of n recommendations"""
+    return min(max(n_recommendations * 10, 50), MAX_POOL_SIZE)
+
+def mmr_rerank(relevance, vectors, n, diversity=0.3):
+    """Indices of n candidates picked greedily by maximal marginal relevance.
+    
+    Each step picks the candidate maximising
+    (1 - diversity) * relevance - diversity * max similarity to the picked ones,
+    with relevance scaled to [0, 1] and `vectors` L2-normalised (all-zero rows are
+    never similar to anything). The max similarity of the whole pool is updated
+    with one matrix-vector product per pick, so the cost is O(n * pool * dim).
+    """
+    relevance = np.asarray(relevance, dtype=np.float32)
+    k = min(n, len(relevance))
+    if diversity <= 0 or k <= 1:
+        return np.argsort(-relevance, kind='stable')[:k]
+    
+    top = relevance.max()
+    relevance = relevance / top if top > 0 else np.ones_like(relevance)
+    
+    gain = (1.0 - diversity) * relevance
+    max_similarity = np.zeros_like(relevance)
+    picked = np.zeros(len(relevance), dtype=bool)
+    order = np.empty(k, dtype=np.int64)
+    
+    for step in range(k):
+        scores = gain - diversity * max_similarity
+        scores[picked] = -np.inf
+        choice = int(np.argmax(scores))
+        order[step] = choice
+        picked[choice] = True
+        np.maximum(max_similarity, vectors @ vectors[choice], out=max_similarity)
+    
+    return order
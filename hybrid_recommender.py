@@ -1,91 +1,245 @@
+import os
+import json
+import threading
 import numpy as np
 import pandas as pd
 from collaborative_filtering import CollaborativeFilteringRecommender
 from content_based import ContentBasedRecommender
+from sequence_recommender import SequenceRecommender
+from training_pipeline import build_recommender_pipeline
+from diversity import pool_size
 
 class HybridRecommender:
-    def __init__(self, collab_weight=0.6, content_weight=0.4):
+    # Fusion parameters that can be tuned and exported by hybrid_tuning.py
+    CONFIG_FIELDS = ['collab_weight', 'content_weight', 'sequence_weight', 'user_based_discount', 'rank_decay', 'rank_decay_floor']
+    
+    def __init__(self, collab_weight=0.6, content_weight=0.4, use_vector_index=False, preload=True,
+                 user_based_discount=0.8, rank_decay=0.1, rank_decay_floor=0.1, config_path=None,
+                 together_top_k=20, together_min_support=2, sequence_weight=0.2, sequence_completion_floor=0.2,
+                 source_depth=50):
         """Initialize hybrid recommender with weights for each approach"""
-        self.collaborative_recommender = CollaborativeFilteringRecommender()
-        self.content_recommender = ContentBasedRecommender()
+        self.collaborative_recommender = CollaborativeFilteringRecommender(use_vector_index=use_vector_index)
+        self.content_recommender = ContentBasedRecommender(use_vector_index=use_vector_index)
         self.collab_weight = collab_weight
         self.content_weight = content_weight
+        self.pipeline = None
+        
+        # "Frequently taken together" index, built by the training pipeline
+        self.together_top_k = together_top_k
+        self.together_min_support = together_min_support
+        self.co_enrolment_index = None
+        self.co_enrolment_lock = threading.Lock()
+        
+        # Next-course model from the order of users' enrolments, built by the training pipeline
+        self.sequence_weight = sequence_weight
+        self.sequence_completion_floor = sequence_completion_floor
+        self.sequence_recommender = SequenceRecommender(sequence_completion_floor)
         
-        # Initialize data
-        self.collaborative_recommender.preprocess_data()
+        # Fusion parameters: user-based CF counts for a fraction of the collaborative weight, and a
+        # candidate at position i of a source list scores max(1 - rank_decay * i, rank_decay_floor)
+        self.user_based_discount = user_based_discount
+        self.rank_decay = rank_decay
+        self.rank_decay_floor = rank_decay_floor
+        # Candidates taken from each source. Fixed rather than derived from the requested length, so
+        # rank(user, n) is always a prefix of rank(user, m) for m > n and cached pages stay consistent.
+        self.source_depth = source_depth
+        
+        # A tuned configuration (see hybrid_tuning.py) overrides the defaults
+        config_path = config_path or os.getenv('HYBRID_CONFIG_PATH')
+        if config_path and os.path.exists(config_path):
+            self.load_config(config_path)
+        
+        # Initialize data (pass preload=False to defer this, e.g. to a background thread, and call build() later)
+        if preload:
+            self.collaborative_recommender.preprocess_data()
     
-    def recommend(self, user_id, n_recommendations=5):
-        """Generate hybrid recommendations for a user"""
-        # Get collaborative filtering recommendations
-        collab_item_recommendations = self.collaborative_recommender.recommend_item_based(user_id, n_recommendations*2)
-        collab_user_recommendations = self.collaborative_recommender.recommend_user_based(user_id, n_recommendations*2)
+    def build(self):
+        """Load data and train every model up front so the first request does not pay for it.
+        
+        Runs the cached training pipeline: stages whose inputs did not change since the
+        last build (in this process or a previous one) are reused instead of recomputed.
+        """
+        if self.pipeline is None:
+            self.pipeline = build_recommender_pipeline(self)
+        
+        artifacts = self.pipeline.run()
+        
+        self.co_enrolment_index = artifacts['co_enrolment']
+        self.sequence_recommender = artifacts['transitions']
+        
+        if artifacts['interactions'] is None:
+            return False
+        
+        self.collaborative_recommender.load_artifacts({
+            'courses_df': artifacts['catalogue'],
+            'users_df': artifacts['users'],
+            'interaction_matrix': artifacts['interactions'],
+            'user_similarity_matrix': artifacts['user_similarity'],
+            **artifacts['item_similarity']
+        })
+        
+        if artifacts['content_similarity'] is None:
+            return False
+        
+        # Text features come from the cached stages, ratings and purchase counts from the fresh catalogue
+        courses_df = artifacts['content_features'].merge(artifacts['catalogue'], on='_id', how='left')
+        
+        self.content_recommender.load_artifacts({
+            'courses_df': courses_df,
+            'tfidf_matrix': artifacts['vectorizer'],
+            'users_df': artifacts['users'],
+            **artifacts['content_similarity']
+        })
+        return True
+    
+    def reuse_artifacts(self, other):
+        """Start from another recommender's in-memory training artifacts, e.g. when rebuilding a served model"""
+        if other.pipeline is not None:
+            self.pipeline = build_recommender_pipeline(self)
+            self.pipeline.memory = dict(other.pipeline.memory)
+    
+    def load_config(self, path):
+        """Load fusion weights exported by hybrid_tuning.py"""
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        
+        for name in self.CONFIG_FIELDS:
+            if name in config:
+                setattr(self, name, float(config[name]))
+        
+        # The weights were tuned on candidates collected at this depth
+        if 'source_depth' in config:
+            self.source_depth = int(config['source_depth'])
+    
+    def source_weights(self):
+        """Weight of each candidate source in the fused score"""
+        return {
+            'collaborative_item': self.collab_weight,
+            'collaborative_user': self.collab_weight * self.user_based_discount,
+            'content': self.content_weight,
+            'sequence': self.sequence_weight,
+        }
+    
+    def source_rankings(self, user_id, depth):
+        """Ranked (course_id, score, explanation) candidates from each source, keyed by source name"""
+        return {
+            # Get collaborative filtering recommendations
+            'collaborative_item': self.collaborative_recommender.rank_item_based(user_id, depth),
+            'collaborative_user': self.collaborative_recommender.rank_user_based(user_id, depth),
+            # Get content-based recommendations
+            'content': self.content_recommender.rank_for_user(user_id, depth),
+            # Get what users typically take after this user's most recent course
+            'sequence': self.sequence_recommender.rank_for_user(user_id, depth),
+        }
+    
+    def rank(self, user_id, n_recommendations=5, diversity=0.0):
+        """Return (course_id, score, sources) tuples of hybrid recommendations for a user, best first
+        
+        With diversity > 0 a larger pool of fused candidates is re-ranked by maximal marginal
+        relevance over course similarity (0 = pure relevance, 1 = pure novelty).
+        """
+        if diversity > 0:
+            candidates = self.rank(user_id, pool_size(n_recommendations))
+            return self.content_recommender.diversify(candidates, n_recommendations, diversity)
         
-        # Get content-based recommendations
-        content_recommendations = self.content_recommender.recommend_for_user(user_id, n_recommendations*2)
+        rankings = self.source_rankings(user_id, self.source_depth)
+        weights = self.source_weights()
         
         # Combine recommendations with weights
         all_recommendations = {}
+        course_sources = {}
         
-        # Process collaborative filtering (item-based) recommendations
-        for i, course in enumerate(collab_item_recommendations):
-            course_id = course['_id']
-            if course_id not in all_recommendations:
-                all_recommendations[course_id] = 0
-            # Assign score based on position and weight
-            score = self.collab_weight * (1.0 - (i * 0.1 if i < 10 else 0.9))
-            all_recommendations[course_id] += score
-        
-        # Process collaborative filtering (user-based) recommendations
-        for i, course in enumerate(collab_user_recommendations):
-            course_id = course['_id']
-            if course_id not in all_recommendations:
-                all_recommendations[course_id] = 0
-            # Assign score based on position and weight
-            score = self.collab_weight * 0.8 * (1.0 - (i * 0.1 if i < 10 else 0.9))
-            all_recommendations[course_id] += score
-        
-        # Process content-based recommendations
-        for i, course in enumerate(content_recommendations):
-            course_id = course['_id']
-            if course_id not in all_recommendations:
-                all_recommendations[course_id] = 0
-            # Assign score based on position and weight
-            score = self.content_weight * (1.0 - (i * 0.1 if i < 10 else 0.9))
-            all_recommendations[course_id] += score
+        for source, ranked in rankings.items():
+            weight = weights[source]
+            for i, (course_id, _, _) in enumerate(ranked):
+                if course_id not in all_recommendations:
+                    all_recommendations[course_id] = 0
+                    course_sources[course_id] = []
+                # Assign score based on position and weight
+                score = weight * max(1.0 - i * self.rank_decay, self.rank_decay_floor)
+                all_recommendations[course_id] += score
+                course_sources[course_id].append(source)
         
         # Sort recommendations by score
         sorted_recommendations = sorted(all_recommendations.items(), key=lambda x: x[1], reverse=True)
         
         # Get top n course IDs
-        top_course_ids = [course_id for course_id, _ in sorted_recommendations[:n_recommendations]]
-        
+        return [
+            (course_id, score, course_sources[course_id])
+            for course_id, score in sorted_recommendations[:n_recommendations]
+        ]
+    
+    def recommend(self, user_id, n_recommendations=5, diversity=0.0):
+        """Generate hybrid recommendations for a user"""
         # Get course details
-        courses_df = self.collaborative_recommender.courses_df
-        recommended_courses = courses_df[courses_df['_id'].isin(top_course_ids)].to_dict('records')
-        
-        return recommended_courses
+        return self.collaborative_recommender.course_records(self.rank(user_id, n_recommendations, diversity))
+    
+    def rank_similar_to_course(self, course_id, n_recommendations=5):
+        """Return (course_id, similarity, matching_topics) tuples for courses similar to a given course"""
+        return self.content_recommender.rank_similar_courses(course_id, n_recommendations)
     
     def recommend_similar_to_course(self, course_id, n_recommendations=5):
         """Recommend courses similar to a given course"""
         return self.content_recommender.recommend_similar_courses(course_id, n_recommendations)
     
-    def recommend_popular_courses(self, n_recommendations=5):
-        """Recommend popular courses based on ratings and purchase count"""
+    def rank_taken_together(self, course_id, n_recommendations=5):
+        """Return (course_id, lift, explanation) tuples for courses frequently taken with a given course"""
+        if self.co_enrolment_index is None:
+            self.build()
+        
+        return self.co_enrolment_index.lookup(course_id, n_recommendations)
+    
+    def add_enrolments(self, enrolments):
+        """Fold new (user_id, course_id) enrolments into the co-enrolment index without a rebuild.
+        
+        Returns (number of new enrolments, rejected (user_id, course_id) pairs for unknown users or courses).
+        """
+        if self.co_enrolment_index is None:
+            self.build()
+        
+        with self.co_enrolment_lock:
+            # The built index is also the pipeline artifact that the next refresh reuses, so
+            # enrolments that are not in the database yet only go into this model's own copy
+            if self.co_enrolment_index is self.pipeline.memory['co_enrolment'].value:
+                self.co_enrolment_index = self.co_enrolment_index.copy()
+            index = self.co_enrolment_index
+        
+        return index.add_enrolments(enrolments)
+    
+    def rank_next_courses(self, user_id, n_recommendations=5):
+        """Return (course_id, probability, explanation) tuples for what a user typically takes next"""
+        if self.sequence_recommender.transitions is None:
+            self.build()
+        
+        return self.sequence_recommender.rank_for_user(user_id, n_recommendations)
+    
+    def rank_popular_courses(self, n_recommendations=5):
+        """Return (course_id, popularity_score, None) tuples based on ratings and purchase count, best first"""
         courses_df = self.collaborative_recommender.courses_df
         
         if 'ratings' in courses_df.columns and 'purchased' in courses_df.columns:
             # Create a popularity score based on ratings and purchase count
-            courses_df['popularity_score'] = (
+            popularity_score = (
                 courses_df['ratings'].fillna(0) * 0.7 + 
                 courses_df['purchased'].fillna(0) * 0.3
             )
             
             # Sort by popularity score and get top n
-            popular_courses = courses_df.sort_values(by='popularity_score', ascending=False).head(n_recommendations)
-            return popular_courses.to_dict('records')
+            popular = popularity_score.sort_values(ascending=False).head(n_recommendations)
+            return [(courses_df.at[idx, '_id'], float(score), None) for idx, score in popular.items()]
         
         return []
     
+    def recommend_popular_courses(self, n_recommendations=5):
+        """Recommend popular courses based on ratings and purchase count"""
+        ranked = self.rank_popular_courses(n_recommendations)
+        
+        popular_courses = self.collaborative_recommender.course_records(ranked)
+        for course, (_, score, _) in zip(popular_courses, ranked):
+            course['popularity_score'] = score
+        
+        return popular_courses
+    
     def close(self):
         """Close recommender connections"""
         self.collaborative_recommender.close()
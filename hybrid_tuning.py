@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Tune the HybridRecommender fusion weights offline
+
+Hides one purchased course per evaluation user, retrains the sources on the
+remaining data, and collects each source's ranked candidates once. Every point
+of the weight / decay grid is then evaluated by re-fusing those cached
+positions with NumPy, so a sweep over thousands of configurations takes seconds.
+
+Usage:
+    python hybrid_tuning.py --users 500 --k 10 --output hybrid_config.json
+
+Load the result with HybridRecommender(config_path=...) or HYBRID_CONFIG_PATH.
+"""
+
+import json
+import time
+import argparse
+import itertools
+import numpy as np
+import pandas as pd
+from sequence_recommender import SequenceRecommender
+
+DEFAULT_GRID = {
+    'collab_weight': [0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8],
+    'sequence_weight': [0.0, 0.1, 0.2, 0.4],
+    'user_based_discount': [0.4, 0.6, 0.8, 1.0, 1.2],
+    'rank_decay': [0.025, 0.05, 0.1, 0.2],
+    'rank_decay_floor': [0.0, 0.1, 0.3],
+}
+
+# Peak bytes per (config, user, course) cell while a chunk is scored: float32 scores,
+# int64 argpartition indices and slack for the smaller temporaries
+BYTES_PER_CELL = 16
+
+def holdout_split(users_df, n_users=500, min_courses=2, seed=42):
+    """Hide one purchased course from each sampled user.
+    
+    Returns (masked users_df, {user_id: held-out course_id}); the held-out course is
+    removed from both the user's courses and progress.
+    """
+    rng = np.random.default_rng(seed)
+    candidates = [
+        i for i, courses in enumerate(users_df['courses'])
+        if isinstance(courses, list) and len([c for c in courses if 'courseId' in c]) >= min_courses
+    ]
+    chosen = rng.choice(candidates, min(n_users, len(candidates)), replace=False) if candidates else []
+    
+    masked_df = users_df.copy()
+    held_out = {}
+    for i in chosen:
+        user = masked_df.iloc[i]
+        courses = [c for c in user['courses'] if 'courseId' in c]
+        hidden = str(courses[rng.integers(len(courses))]['courseId'])
+        
+        masked_df.at[masked_df.index[i], 'courses'] = [c for c in user['courses'] if str(c.get('courseId')) != hidden]
+        if isinstance(user['progress'], list):
+            masked_df.at[masked_df.index[i], 'progress'] = [p for p in user['progress'] if str(p.get('courseId')) != hidden]
+        held_out[str(user['_id'])] = hidden
+    
+    return masked_df, held_out
+
+def train_on_users(recommender, users_df, courses_df=None):
+    """Train every source of a HybridRecommender on the given users instead of the database's"""
+    collaborative = recommender.collaborative_recommender
+    content = recommender.content_recommender
+    courses_df = collaborative.data_loader.load_courses() if courses_df is None else courses_df
+    
+    interactions = collaborative.build_interaction_matrix(users_df, courses_df)
+    collaborative.load_artifacts({
+        'courses_df': courses_df,
+        'users_df': users_df,
+        'interaction_matrix': interactions,
+        'user_similarity_matrix': collaborative.compute_user_similarity(interactions),
+        **collaborative.compute_item_similarity(interactions)
+    })
+    
+    content.train()
+    content.users_df = users_df
+    
+    recommender.sequence_recommender = SequenceRecommender(recommender.sequence_completion_floor).build(
+        users_df.to_dict('records'), courses_df['_id']
+    )
+
+class HybridTuner:
+    """Sweeps fusion parameters over cached per-source candidate rankings.
+    
+    `positions[s, u, c]` is the rank of course c in source s's list for user u, or
+    -1 when the course is not a candidate. Fusing is then a weighted sum of
+    decay(positions) over sources, computed for a whole grid at once.
+    """
+    
+    def __init__(self, recommender, held_out, depth=None):
+        self.recommender = recommender
+        self.held_out = held_out
+        # Defaults to the depth HybridRecommender.rank uses, so the sweep evaluates the fusion that is served
+        self.depth = depth or recommender.source_depth
+        self.sources = list(recommender.source_weights())
+        self.user_ids = list(held_out)
+        self.course_ids = None
+        self.positions = None
+        self.relevant = None
+    
+    def collect(self):
+        """Run every source once per evaluation user and cache the candidate positions"""
+        rankings = [self.recommender.source_rankings(user_id, self.depth) for user_id in self.user_ids]
+        
+        self.course_ids = sorted(set(
+            course_id for per_user in rankings for ranked in per_user.values() for course_id, _, _ in ranked
+        ).union(self.held_out.values()))
+        course_index = {course_id: i for i, course_id in enumerate(self.course_ids)}
+        
+        self.positions = np.full((len(self.sources), len(self.user_ids), len(self.course_ids)), -1, dtype=np.int16)
+        for u, per_user in enumerate(rankings):
+            for s, source in enumerate(self.sources):
+                for position, (course_id, _, _) in enumerate(per_user.get(source, [])):
+                    self.positions[s, u, course_index[course_id]] = position
+        
+        self.relevant = np.zeros((len(self.user_ids), len(self.course_ids)), dtype=bool)
+        for u, user_id in enumerate(self.user_ids):
+            self.relevant[u, course_index[self.held_out[user_id]]] = True
+        
+        return self
+    
+    def _metrics(self, scores, k):
+        """hit rate, MRR and NDCG at k for a (configs, users, courses) score tensor"""
+        k = min(k, scores.shape[2])
+        # Negated in place rather than copied, the tensor is the largest allocation of the sweep
+        np.negative(scores, out=scores)
+        top = np.argpartition(scores, k - 1, axis=2)[:, :, :k]
+        top_scores = -np.take_along_axis(scores, top, axis=2)
+        order = np.argsort(-top_scores, axis=2, kind='stable')
+        top = np.take_along_axis(top, order, axis=2)
+        top_scores = np.take_along_axis(top_scores, order, axis=2)
+        
+        # Courses no source proposed are never recommended
+        hits = self.relevant[np.arange(len(self.user_ids))[None, :, None], top] & np.isfinite(top_scores)
+        
+        ranks = np.arange(1, k + 1)
+        found = hits.any(axis=2)
+        first = np.argmax(hits, axis=2)
+        hit_rate = found.mean(axis=1)
+        mrr = np.where(found, 1.0 / (first + 1), 0.0).mean(axis=1)
+        # One relevant item per user, so the ideal DCG is 1
+        ndcg = (hits / np.log2(ranks + 1)).sum(axis=2).mean(axis=1)
+        return hit_rate, mrr, ndcg
+    
+    def sweep(self, grid=None, k=10, memory_mb=256):
+        """Evaluate every configuration of the grid, best NDCG first
+        
+        Configurations are scored in chunks sized so that the (configs, users, courses)
+        score tensor stays within about `memory_mb`, whatever the catalogue size.
+        """
+        grid = grid or DEFAULT_GRID
+        present = self.positions >= 0
+        results = []
+        cells = max(len(self.user_ids) * len(self.course_ids), 1)
+        chunk_size = max(1, int(memory_mb * 2 ** 20 // (BYTES_PER_CELL * cells)))
+        
+        for decay, floor in itertools.product(grid['rank_decay'], grid['rank_decay_floor']):
+            # Position decay for every source / user / candidate, zero where a source has no opinion
+            decayed = np.where(present, np.maximum(1.0 - self.positions * decay, floor), 0.0).astype(np.float32)
+            proposed = present.any(axis=0)
+            
+            weight_configs = list(itertools.product(
+                grid['collab_weight'], grid['user_based_discount'], grid['sequence_weight']
+            ))
+            for start in range(0, len(weight_configs), chunk_size):
+                chunk = weight_configs[start:start + chunk_size]
+                weights = np.array([
+                    [self._source_weight(source, collab, discount, sequence) for source in self.sources]
+                    for collab, discount, sequence in chunk
+                ], dtype=np.float32)
+                
+                scores = np.einsum('gs,suc->guc', weights, decayed)
+                scores[:, ~proposed] = -np.inf
+                hit_rate, mrr, ndcg = self._metrics(scores, k)
+                
+                for i, (collab, discount, sequence) in enumerate(chunk):
+                    results.append({
+                        'collab_weight': collab,
+                        'content_weight': round(1.0 - collab, 6),
+                        'sequence_weight': sequence,
+                        'user_based_discount': discount,
+                        'rank_decay': decay,
+                        'rank_decay_floor': floor,
+                        f'hit_rate@{k}': float(hit_rate[i]),
+                        f'mrr@{k}': float(mrr[i]),
+                        f'ndcg@{k}': float(ndcg[i]),
+                    })
+        
+        return pd.DataFrame(results).sort_values(f'ndcg@{k}', ascending=False, kind='stable').reset_index(drop=True)
+    
+    def _source_weight(self, source, collab_weight, user_based_discount, sequence_weight):
+        if source == 'collaborative_item':
+            return collab_weight
+        if source == 'collaborative_user':
+            return collab_weight * user_based_discount
+        if source == 'sequence':
+            return sequence_weight
+        return 1.0 - collab_weight
+
+def export_config(row, path, fields, source_depth):
+    """Write the chosen configuration (and its metrics) for HybridRecommender.load_config"""
+    config = {name: float(row[name]) for name in fields}
+    config['source_depth'] = int(source_depth)
+    config['metrics'] = {name: float(value) for name, value in row.items() if '@' in name}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2)
+    return config
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune HybridRecommender fusion weights on a held-out split")
+    parser.add_argument('--users', type=int, default=500, help="number of evaluation users")
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--depth', type=int, default=None, help="candidates per source (default: HybridRecommender.source_depth, as served)")
+    parser.add_argument('--output', default='hybrid_config.json')
+    parser.add_argument('--top', type=int, default=10, help="configurations to print")
+    parser.add_argument('--memory-mb', type=int, default=256, help="approximate memory for scoring a chunk of configurations")
+    args = parser.parse_args()
+    
+    from hybrid_recommender import HybridRecommender
+    
+    recommender = HybridRecommender(preload=False, config_path='')
+    try:
+        users_df = recommender.collaborative_recommender.data_loader.load_users()
+        if users_df.empty:
+            print("Error: No users found in the database.")
+            return
+        
+        masked_df, held_out = holdout_split(users_df, args.users)
+        if not held_out:
+            print("Error: No users with at least two courses to evaluate on.")
+            return
+        
+        start = time.perf_counter()
+        train_on_users(recommender, masked_df)
+        print(f"Trained sources on the held-out split in {time.perf_counter() - start:.2f}s")
+        
+        start = time.perf_counter()
+        tuner = HybridTuner(recommender, held_out, depth=args.depth).collect()
+        print(f"Collected candidates for {len(held_out)} users in {time.perf_counter() - start:.2f}s")
+        
+        start = time.perf_counter()
+        results = tuner.sweep(k=args.k, memory_mb=args.memory_mb)
+        print(f"Evaluated {len(results)} configurations in {time.perf_counter() - start:.2f}s\n")
+        
+        baseline = results[
+            (results['collab_weight'] == 0.6) & (results['user_based_discount'] == 0.8) & (results['sequence_weight'] == 0.2)
+            & (results['rank_decay'] == 0.1) & (results['rank_decay_floor'] == 0.1)
+        ]
+        print(results.head(args.top).to_string(index=False))
+        if not baseline.empty:
+            print("\nCurrent defaults:")
+            print(baseline.to_string(index=False))
+        
+        config = export_config(results.iloc[0], args.output, HybridRecommender.CONFIG_FIELDS, tuner.depth)
+        print(f"\nSaved best configuration to {args.output}: {config}")
+    finally:
+        recommender.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+Local load test for the recommender API
+
+Seeds a stand-in database with synthetic users and courses, starts the API and
+drives /recommend/user, /recommend/similar, /recommend/together, /recommend/next
+and /recommend/popular at a target request rate with a Zipfian id mix. Reports
+p50/p95/p99 latency, errors and the server's resident memory.
+
+Backends:
+    mongomock  in-memory database, the API runs in this process (pip install mongomock)
+    mongod     temporary mongod on a scratch directory (needs the mongod binary on PATH)
+
+Usage:
+    python load_test.py --courses 500 --users 5000 --rps 50 --duration 30
+    python load_test.py --backend mongod --server uvicorn --rps 200 --concurrency 64
+"""
+
+import os
+import sys
+import time
+import json
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+TOPICS = [
+    ('Java', 'java spring hibernate backend'), ('Spring Boot', 'spring java microservices'),
+    ('Python', 'python pandas numpy'), ('Django', 'python django web development'),
+    ('Machine Learning', 'python machine learning scikit-learn'), ('JavaScript', 'javascript dom npm'),
+    ('React', 'react javascript frontend'), ('Node.js', 'node express api backend'),
+    ('Docker', 'docker kubernetes devops'), ('AWS', 'aws cloud devops'),
+    ('SQL', 'sql mysql database'), ('MongoDB', 'mongodb nosql database'),
+    ('Android', 'android kotlin mobile'), ('Flutter', 'flutter mobile ios'),
+    ('C#', 'c# .net asp.net'), ('PHP', 'php laravel web development'),
+]
+LEVELS = ['Beginner', 'Intermediate', 'Advanced']
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def zipf_weights(n, s):
+    """Probabilities proportional to 1 / rank^s"""
+    weights = 1.0 / np.arange(1, n + 1) ** s
+    return weights / weights.sum()
+
+def synthetic_data(n_courses, n_users, zipf_s, seed=42):
+    """Generate course and user documents shaped like the LMS collections"""
+    from bson import ObjectId
+    
+    rng = np.random.default_rng(seed)
+    now = datetime(2025, 1, 1)
+    courses = []
+    for i in range(n_courses):
+        topic, keywords = TOPICS[rng.integers(len(TOPICS))]
+        level = LEVELS[rng.integers(len(LEVELS))]
+        n_lessons = int(rng.integers(3, 12))
+        courses.append({
+            '_id': ObjectId(),
+            'name': f"{topic} {level} Course {i}",
+            'description': f"Learn {topic} from scratch: {keywords}",
+            'categories': topic,
+            'tags': keywords,
+            'level': level,
+            'ratings': float(np.round(rng.uniform(1, 5), 1)),
+            'purchased': 0,
+            'benefits': [{'title': f"Build real {topic} projects"}],
+            'prerequisites': [{'title': 'Basic programming'}],
+            'courseData': [
+                {'title': f"{topic} lesson {j}", 'description': f"{keywords} part {j}", 'videoSection': f"Section {j // 3}"}
+                for j in range(n_lessons)
+            ],
+            'updatedAt': now - timedelta(days=int(rng.integers(365))),
+        })
+    
+    # Course popularity follows a Zipf law, as does the number of courses per user
+    popularity = zipf_weights(n_courses, zipf_s)
+    users = []
+    for u in range(n_users):
+        n_owned = int(min(n_courses, 1 + rng.zipf(2.0)))
+        owned = rng.choice(n_courses, n_owned, replace=False, p=popularity)
+        user_courses, progress = [], []
+        for c in owned:
+            course = courses[c]
+            course['purchased'] += 1
+            user_courses.append({'courseId': str(course['_id'])})
+            progress.append({
+                'courseId': str(course['_id']),
+                'chapters': [{'isCompleted': bool(rng.random() < 0.6)} for _ in range(len(course['courseData']))],
+            })
+        users.append({'_id': ObjectId(), 'name': f"User {u}", 'email': f"user{u}@example.com", 'courses': user_courses, 'progress': progress})
+    
+    return courses, users
+
+def seed_database(db, courses, users):
+    db.courses.drop()
+    db.users.drop()
+    db.courses.insert_many(courses)
+    db.users.insert_many(users)
+
+class MongoBackend:
+    """Stand-in database: in-memory mongomock or a throwaway mongod process"""
+    
+    def __init__(self, kind):
+        self.kind = kind
+        self.process = None
+        self.dbpath = None
+        self.client = None
+        self.uri = None
+    
+    def start(self):
+        if self.kind == 'mongomock':
+            try:
+                import mongomock
+            except ImportError:
+                sys.exit("Error: the mongomock backend needs `pip install mongomock`")
+            
+            self.uri = 'mongodb://localhost:27017/loadtest'
+            self.client = mongomock.MongoClient(self.uri)
+            
+            # Route every DataLoader in this process to the in-memory database
+            import data_loader
+            data_loader.MongoClient = lambda uri: self.client
+        else:
+            mongod = shutil.which('mongod')
+            if mongod is None:
+                sys.exit("Error: the mongod backend needs the mongod binary on PATH")
+            
+            from pymongo import MongoClient
+            
+            port = free_port()
+            self.dbpath = tempfile.mkdtemp(prefix='lms-loadtest-')
+            self.process = subprocess.Popen(
+                [mongod, '--dbpath', self.dbpath, '--port', str(port), '--bind_ip', '127.0.0.1'],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            self.uri = f"mongodb://127.0.0.1:{port}/loadtest"
+            self.client = MongoClient(self.uri, serverSelectionTimeoutMS=30000)
+            self.client.server_info()
+        
+        return self.client.get_database()
+    
+    def stop(self):
+        if self.process is not None:
+            self.client.close()
+            self.process.terminate()
+            self.process.wait()
+            shutil.rmtree(self.dbpath, ignore_errors=True)
+
+class APIServer:
+    """The API under uvicorn, either on a thread in this process or as a child process"""
+    
+    def __init__(self, mode, port, mongo_uri):
+        self.mode = mode
+        self.port = port
+        self.mongo_uri = mongo_uri
+        self.server = None
+        self.thread = None
+        self.process = None
+    
+    @property
+    def pid(self):
+        return self.process.pid if self.process is not None else os.getpid()
+    
+    def start(self):
+        if self.mode == 'inprocess':
+            import uvicorn
+            from api import app
+            
+            config = uvicorn.Config(app, host='127.0.0.1', port=self.port, log_level='warning')
+            self.server = uvicorn.Server(config)
+            self.thread = threading.Thread(target=self.server.run, daemon=True)
+            self.thread.start()
+        else:
+            env = dict(os.environ, MONGODB_URI=self.mongo_uri)
+            self.process = subprocess.Popen(
+                [sys.executable, '-m', 'uvicorn', 'api:app', '--host', '127.0.0.1', '--port', str(self.port), '--log-level', 'warning'],
+                env=env
+            )
+    
+    def wait_ready(self, timeout):
+        """Wait for the readiness probe, returning the seconds it took"""
+        start = time.perf_counter()
+        while time.perf_counter() - start < timeout:
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=2)
+                connection.request('GET', '/ready')
+                status = connection.getresponse().status
+                connection.close()
+                if status == 200:
+                    return time.perf_counter() - start
+            except OSError:
+                pass
+            time.sleep(0.1)
+        return None
+    
+    def stop(self):
+        if self.server is not None:
+            self.server.should_exit = True
+            self.thread.join(10)
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait()
+
+def rss_mb(pid):
+    """Resident set size of a process in MB (Linux /proc, falling back to this process's peak RSS)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+class LoadGenerator:
+    """Open-loop request generator: requests are scheduled at the target rate regardless of response times"""
+    
+    def __init__(self, port, concurrency):
+        self.port = port
+        self.local = threading.local()
+        self.pool = ThreadPoolExecutor(max_workers=concurrency)
+        self.lock = threading.Lock()
+        self.results = {}
+    
+    def _connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+            self.local.connection = connection
+        return connection
+    
+    def _request(self, endpoint, path, scheduled):
+        start = time.perf_counter()
+        ok = False
+        try:
+            connection = self._connection()
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            ok = response.status == 200
+        except (OSError, http.client.HTTPException):
+            self.local.connection = None
+        end = time.perf_counter()
+        
+        with self.lock:
+            result = self.results.setdefault(endpoint, {'latencies': [], 'errors': 0, 'lag': []})
+            result['latencies'].append(end - start)
+            result['lag'].append(start - scheduled)
+            if not ok:
+                result['errors'] += 1
+    
+    def run(self, requests, rps, duration, on_tick=None):
+        """Issue (endpoint, path) requests at `rps` for `duration` seconds"""
+        interval = 1.0 / rps
+        start = time.perf_counter()
+        futures = []
+        i = 0
+        next_tick = start
+        
+        while True:
+            scheduled = start + i * interval
+            if scheduled - start >= duration:
+                break
+            
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            
+            endpoint, path = next(requests)
+            futures.append(self.pool.submit(self._request, endpoint, path, scheduled))
+            i += 1
+            
+            if on_tick is not None and time.perf_counter() >= next_tick:
+                on_tick()
+                next_tick += 1.0
+        
+        for future in futures:
+            future.result()
+        self.pool.shutdown()
+        
+        return time.perf_counter() - start
+
+def request_stream(user_ids, course_ids, mix, zipf_s, limit, seed=7):
+    """Endless stream of (endpoint, path) with Zipf-distributed user and course ids"""
+    rng = np.random.default_rng(seed)
+    endpoints = list(mix)
+    endpoint_p = np.array([mix[e] for e in endpoints], dtype=float)
+    endpoint_p /= endpoint_p.sum()
+    
+    # Shuffle so that the hot ids are not simply the first ones inserted
+    user_ids = list(rng.permutation(user_ids))
+    course_ids = list(rng.permutation(course_ids))
+    user_p = zipf_weights(len(user_ids), zipf_s)
+    course_p = zipf_weights(len(course_ids), zipf_s)
+    
+    while True:
+        batch_endpoints = rng.choice(len(endpoints), 1024, p=endpoint_p)
+        batch_users = rng.choice(len(user_ids), 1024, p=user_p)
+        batch_courses = rng.choice(len(course_ids), 1024, p=course_p)
+        for e, u, c in zip(batch_endpoints, batch_users, batch_courses):
+            endpoint = endpoints[e]
+            if endpoint == 'user':
+                yield endpoint, f"/recommend/user/{user_ids[u]}?limit={limit}"
+            elif endpoint == 'similar':
+                yield endpoint, f"/recommend/similar/{course_ids[c]}?limit={limit}"
+            elif endpoint == 'next':
+                yield endpoint, f"/recommend/next/{user_ids[u]}?limit={limit}"
+            elif endpoint == 'together':
+                yield endpoint, f"/recommend/together/{course_ids[c]}?limit={limit}"
+            else:
+                yield endpoint, f"/recommend/popular?limit={limit}"
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, weight = part.split('=')
+        if name not in ('user', 'similar', 'together', 'next', 'popular'):
+            raise argparse.ArgumentTypeError(f"unknown endpoint {name!r}")
+        mix[name] = float(weight)
+    return mix
+
+def report(results, elapsed, rss):
+    summary = {'elapsed_s': round(elapsed, 2), 'endpoints': {}, 'rss_mb': rss}
+    print(f"\n{'endpoint':<10}{'requests':>10}{'errors':>8}{'rps':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max lag ms':>12}")
+    
+    all_latencies = []
+    total_errors = 0
+    for endpoint, result in sorted(results.items()):
+        latencies = np.array(result['latencies']) * 1000
+        all_latencies.append(latencies)
+        total_errors += result['errors']
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        lag = max(result['lag']) * 1000
+        print(f"{endpoint:<10}{len(latencies):>10}{result['errors']:>8}{len(latencies) / elapsed:>8.1f}{p50:>10.2f}{p95:>10.2f}{p99:>10.2f}{lag:>12.1f}")
+        summary['endpoints'][endpoint] = {
+            'requests': len(latencies), 'errors': result['errors'],
+            'p50_ms': round(p50, 3), 'p95_ms': round(p95, 3), 'p99_ms': round(p99, 3)
+        }
+    
+    if all_latencies:
+        latencies = np.concatenate(all_latencies)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        print(f"{'all':<10}{len(latencies):>10}{total_errors:>8}{len(latencies) / elapsed:>8.1f}{p50:>10.2f}{p95:>10.2f}{p99:>10.2f}")
+        summary['all'] = {'requests': len(latencies), 'errors': total_errors, 'p50_ms': round(p50, 3), 'p95_ms': round(p95, 3), 'p99_ms': round(p99, 3)}
+    
+    print(f"\nServer RSS: start {rss['start']:.1f} MB, ready {rss['ready']:.1f} MB, peak {rss['peak']:.1f} MB, end {rss['end']:.1f} MB")
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the recommender API against a local stand-in database")
+    parser.add_argument('--courses', type=int, default=300)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--backend', choices=['mongomock', 'mongod'], default='mongomock')
+    parser.add_argument('--server', choices=['inprocess', 'uvicorn'], default='inprocess',
+                        help="uvicorn runs the API as a separate process (requires --backend mongod)")
+    parser.add_argument('--rps', type=float, default=20)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--zipf', type=float, default=1.1, help="Zipf exponent for user and course ids")
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('user=0.6,similar=0.3,popular=0.1'))
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--ready-timeout', type=float, default=600)
+    parser.add_argument('--json', help="also write the summary to this file")
+    args = parser.parse_args()
+    
+    if args.server == 'uvicorn' and args.backend == 'mongomock':
+        parser.error("--server uvicorn needs --backend mongod, mongomock only lives in this process")
+    
+    backend = MongoBackend(args.backend)
+    server = None
+    # The content feature cache and training artifacts must not leak between runs or into ./cache
+    cache_dir = tempfile.mkdtemp(prefix='lms-loadtest-cache-')
+    try:
+        print(f"Seeding {args.backend} with {args.courses} courses and {args.users} users...")
+        db = backend.start()
+        courses, users = synthetic_data(args.courses, args.users, args.zipf)
+        seed_database(db, courses, users)
+        
+        os.environ['CONTENT_CACHE_PATH'] = os.path.join(cache_dir, 'content_features.json')
+        os.environ['ARTIFACT_DIR'] = os.path.join(cache_dir, 'artifacts')
+        os.environ['MONGODB_URI'] = backend.uri
+        
+        server = APIServer(args.server, free_port(), backend.uri)
+        server.start()
+        rss = {'start': rss_mb(server.pid)}
+        
+        ready_seconds = server.wait_ready(args.ready_timeout)
+        if ready_seconds is None:
+            sys.exit("Error: the API did not become ready in time")
+        rss['ready'] = rss_mb(server.pid)
+        print(f"Model ready after {ready_seconds:.2f}s")
+        
+        requests = request_stream(
+            [str(u['_id']) for u in users], [str(c['_id']) for c in courses],
+            args.mix, args.zipf, args.limit
+        )
+        peak = [rss['ready']]
+        
+        def sample_rss():
+            peak[0] = max(peak[0], rss_mb(server.pid))
+        
+        print(f"Driving {args.rps:g} rps for {args.duration:g}s ({args.concurrency} workers)...")
+        generator = LoadGenerator(server.port, args.concurrency)
+        elapsed = generator.run(requests, args.rps, args.duration, on_tick=sample_rss)
+        
+        rss['end'] = rss_mb(server.pid)
+        rss['peak'] = max(peak[0], rss['end'])
+        summary = report(generator.results, elapsed, rss)
+        summary['ready_s'] = round(ready_seconds, 2)
+        summary['config'] = {k: v for k, v in vars(args).items() if k != 'json'}
+        
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(summary, f, indent=2)
+    finally:
+        if server is not None:
+            server.stop()
+        backend.stop()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import os
+import base64
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+
+class StaleCursorError(ValueError):
+    """A cursor from a model version that is no longer served"""
+
+def key_digest(key):
+    """Short hash of a ranked list key, so a cursor cannot be replayed against another list"""
+    return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:12]
+
+def encode_cursor(offset, version, key):
+    """Opaque cursor for the next page of the list `key` ranked by model `version`"""
+    text = f"{version}.{key_digest(key)}.{offset}"
+    return base64.urlsafe_b64encode(text.encode('ascii')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, version, key):
+    """Offset of a cursor made by encode_cursor for the same list and model version.
+    
+    Raises StaleCursorError when the model has been rebuilt since the cursor was
+    issued, and ValueError for anything that is not a cursor for this list.
+    """
+    try:
+        text = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii')
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(f"Invalid cursor {cursor!r}")
+    
+    parts = text.split('.')
+    if len(parts) != 3 or not parts[0].isdigit() or not parts[2].isdigit():
+        raise ValueError(f"Invalid cursor {cursor!r}")
+    if parts[1] != key_digest(key):
+        raise ValueError(f"Cursor {cursor!r} belongs to a different list")
+    if int(parts[0]) != version:
+        raise StaleCursorError(f"Cursor {cursor!r} is from model version {parts[0]}, the current version is {version}")
+    return int(parts[2])
+
+class RankedList:
+    """A ranked list stored as arrays: course positions in the encoder, scores and codes into its distinct explanations"""
+    
+    __slots__ = ('positions', 'scores', 'explanations', 'explanation_values')
+    
+    def __init__(self, positions, scores, explanations, explanation_values):
+        self.positions = positions
+        self.scores = scores
+        self.explanations = explanations
+        self.explanation_values = explanation_values
+    
+    def __len__(self):
+        return len(self.positions)
+
+class RankingCache:
+    """Bounded LRU cache of ranked recommendation lists for one model version.
+    
+    A list is ranked once, `depth` items deep, the first time it is requested and
+    every page is then a slice of it. Courses are stored as int32 positions in the
+    response encoder, scores as doubles and explanations as uint32 codes into the
+    list's own table of distinct explanations, so a 100 item list takes about 1.6 KB
+    plus its explanations, and evicting a list frees all of it. Plain `array`s keep
+    numpy out of `import api`. A new model version gets a new cache, which drops
+    every list ranked by the previous one.
+    """
+    
+    def __init__(self, encoder, depth=None, max_entries=None):
+        self.encoder = encoder
+        self.depth = depth or int(os.getenv('RANKING_DEPTH', 100))
+        self.max_entries = max_entries or int(os.getenv('RANKING_CACHE_SIZE', 10000))
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def _compact(self, ranked):
+        # Courses the encoder cannot serve would only leave holes in the pages
+        ranked = [item for item in ranked if item[0] in self.encoder.course_positions]
+        
+        # Explanations repeat within a list (the same sources, the same previous course),
+        # so each distinct one is stored once per list and dropped with it on eviction
+        explanations = [tuple(explanation) if explanation else None for _, _, explanation in ranked]
+        codes = {}
+        for explanation in explanations:
+            codes.setdefault(explanation, len(codes))
+        
+        return RankedList(
+            array('i', [self.encoder.course_positions[course_id] for course_id, _, _ in ranked]),
+            array('d', [float(score) for _, score, _ in ranked]),
+            array('I', [codes[explanation] for explanation in explanations]),
+            tuple(codes)
+        )
+    
+    def get(self, key, rank):
+        """The cached list for `key`, ranking it with `rank(depth)` on a miss"""
+        with self.lock:
+            ranked_list = self.entries.get(key)
+            if ranked_list is not None:
+                self.entries.move_to_end(key)
+                return ranked_list
+        
+        # Ranked outside the lock so one slow list does not block every other request
+        ranked_list = self._compact(rank(self.depth))
+        
+        with self.lock:
+            self.entries[key] = ranked_list
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return ranked_list
+    
+    def page(self, key, rank, offset=0, limit=5):
+        """Return (ranked tuples from offset, offset of the next page or None at the end).
+        
+        A page never holds more than `depth` items; a non-positive limit is treated as 1 so
+        the next cursor always moves forward.
+        """
+        ranked_list = self.get(key, rank)
+        end = min(offset + min(max(limit, 1), self.depth), len(ranked_list))
+        
+        ranked = [
+            (self.encoder.course_ids[position], score, ranked_list.explanation_values[code])
+            for position, score, code in zip(
+                ranked_list.positions[offset:end],
+                ranked_list.scores[offset:end],
+                ranked_list.explanations[offset:end]
+            )
+        ]
+        return ranked, (end if end < len(ranked_list) else None)
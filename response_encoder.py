@@ -0,0 +1,88 @@
+import json
+import math
+
+try:
+    import orjson
+except ImportError:  # optional, the stdlib encoder is used when it is not installed
+    orjson = None
+
+def dumps(value):
+    """Serialise a JSON value to bytes, using orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def _text(value, default=None):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return default
+    return str(value)
+
+def _number(value, cast):
+    try:
+        value = cast(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+class CourseResponseEncoder:
+    """Pre-serialised course payloads for the recommendation endpoints.
+    
+    Every course's public fields are converted to plain Python types and encoded
+    once per model version. A response is then assembled by concatenating the
+    cached bytes for the ranked course ids, appending the optional score and
+    explanation fields only when requested.
+    """
+    
+    # Public course fields and how to coerce them, matching CourseBase in api.py
+    FIELDS = [
+        ('_id', lambda value: _text(value, '')),
+        ('name', lambda value: _text(value, '')),
+        ('description', lambda value: _text(value, '')),
+        ('categories', _text),
+        ('tags', _text),
+        ('level', _text),
+        ('ratings', lambda value: _number(value, float)),
+        ('purchased', lambda value: _number(value, int)),
+    ]
+    
+    def __init__(self, courses_df, version=None):
+        self.version = version
+        self.payloads = {}
+        
+        columns = [field for field, _ in self.FIELDS if field in courses_df.columns]
+        coercers = [(field, coerce) for field, coerce in self.FIELDS if field in columns]
+        
+        for course in courses_df[columns].to_dict('records'):
+            payload = {field: coerce(course.get(field)) for field, coerce in coercers}
+            # Keep the object open so optional fields can be appended without re-encoding
+            self.payloads[payload['_id']] = dumps(payload)[:-1]
+        
+        # Stable integer positions, so cached rankings can store courses compactly
+        self.course_ids = list(self.payloads)
+        self.course_positions = {course_id: i for i, course_id in enumerate(self.course_ids)}
+    
+    def encode(self, ranked, explain=False, extra=None):
+        """Encode (course_id, score, explanation) tuples as a RecommendationResponse JSON body
+        
+        `extra` adds top-level fields after the recommendations, e.g. the next page cursor.
+        """
+        parts = []
+        for course_id, score, explanation in ranked:
+            payload = self.payloads.get(course_id)
+            if payload is None:
+                continue
+            
+            if explain:
+                parts.append(
+                    payload
+                    + b',"score":' + dumps(_number(score, float))
+                    + b',"explanation":' + dumps(list(explanation) if explanation else None)
+                    + b'}'
+                )
+            else:
+                parts.append(payload + b'}')
+        
+        body = b'{"recommendations":[' + b','.join(parts) + b']'
+        for name, value in (extra or {}).items():
+            body += b',' + dumps(name) + b':' + dumps(value)
+        return body + b'}'
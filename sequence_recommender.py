@@ -0,0 +1,108 @@
+import numpy as np
+from scipy import sparse
+from data_loader import DataLoader
+
+class SequenceRecommender:
+    """Next-course recommendations from the order in which users take courses.
+    
+    A user's history is their `courses` array in enrolment order, followed by any
+    courses they only have `progress` for. Every consecutive pair (a, b) adds a
+    transition a -> b weighted by how much of a the user completed, so finishing a
+    course and moving on counts more than abandoning it. Transitions are collected
+    in a single pass over the user documents into a row-normalised CSR matrix and
+    served by looking up the row of the user's most recent course.
+    """
+    
+    def __init__(self, completion_floor=0.2):
+        # Weight of a transition out of a course the user never progressed in
+        self.completion_floor = completion_floor
+        self.course_ids = []
+        self.course_positions = {}
+        # Course names for explanations, which are shown to learners
+        self.course_names = {}
+        self.transitions = None
+        self.user_histories = {}
+    
+    def user_history(self, user):
+        """Known course ids of a user document in the order they were taken, with their completion ratios"""
+        purchased_courses, progress_data = DataLoader.extract_user_interactions(user)
+        
+        history = []
+        seen = set()
+        for course_id in purchased_courses + list(progress_data):
+            if course_id in self.course_positions and course_id not in seen:
+                seen.add(course_id)
+                history.append(course_id)
+        
+        return history, progress_data
+    
+    def build(self, users, course_ids, course_names=None):
+        """Build the transition matrix from an iterable of user documents (or records)"""
+        self.course_ids = list(course_ids)
+        self.course_positions = {course_id: i for i, course_id in enumerate(self.course_ids)}
+        self.course_names = dict(course_names or {})
+        self.user_histories = {}
+        
+        rows, cols, weights = [], [], []
+        for user in users:
+            history, progress_data = self.user_history(user)
+            if not history:
+                continue
+            
+            positions = [self.course_positions[course_id] for course_id in history]
+            self.user_histories[str(user['_id'])] = np.array(positions, dtype=np.int32)
+            
+            for i in range(1, len(history)):
+                completion = progress_data.get(history[i - 1], 0.0)
+                rows.append(positions[i - 1])
+                cols.append(positions[i])
+                weights.append(self.completion_floor + (1.0 - self.completion_floor) * completion)
+        
+        n_courses = len(self.course_ids)
+        # Duplicate (a, b) entries are summed when converting to CSR
+        transitions = sparse.csr_matrix(
+            (np.array(weights, dtype=np.float32), (rows, cols)),
+            shape=(n_courses, n_courses)
+        )
+        
+        # Row-normalise so each row is the distribution of the next course
+        totals = np.asarray(transitions.sum(axis=1)).ravel()
+        scale = np.where(totals > 0, 1.0 / np.maximum(totals, 1e-12), 0.0).astype(np.float32)
+        self.transitions = (sparse.diags(scale) @ transitions).tocsr()
+        
+        return self
+    
+    def rank_after_course(self, course_id, n_recommendations=5, exclude=None):
+        """Return (course_id, probability, explanation) tuples for the courses most often taken after a course"""
+        position = self.course_positions.get(course_id)
+        if position is None or self.transitions is None:
+            return []
+        
+        start, end = self.transitions.indptr[position], self.transitions.indptr[position + 1]
+        candidates = self.transitions.indices[start:end]
+        probabilities = self.transitions.data[start:end]
+        
+        if exclude is not None and len(exclude):
+            keep = ~np.isin(candidates, exclude)
+            candidates, probabilities = candidates[keep], probabilities[keep]
+        
+        k = min(n_recommendations, len(candidates))
+        if k == 0:
+            return []
+        top = np.argpartition(-probabilities, k - 1)[:k]
+        top = top[np.argsort(-probabilities[top], kind='stable')]
+        
+        previous = self.course_names.get(course_id) or course_id
+        return [
+            (self.course_ids[candidate], probability, [f"taken next after {previous}", f"probability {probability:.2f}"])
+            for candidate, probability in zip(candidates[top].tolist(), probabilities[top].tolist())
+        ]
+    
+    def rank_for_user(self, user_id, n_recommendations=5):
+        """Return (course_id, probability, explanation) tuples for what a user should take after their most recent course"""
+        history = self.user_histories.get(user_id)
+        if history is None:
+            return []
+        
+        # Courses the user already has are never recommended
+        return self.rank_after_course(self.course_ids[history[-1]], n_recommendations, exclude=history)
@@ -0,0 +1,120 @@
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient # type: ignore
+
+import api
+from response_encoder import CourseResponseEncoder
+from ranking_cache import RankingCache, StaleCursorError, encode_cursor, decode_cursor
+
+COURSE_IDS = [f"c{i}" for i in range(30)]
+
+def make_encoder(version=1):
+    courses_df = pd.DataFrame({
+        '_id': COURSE_IDS,
+        'name': [f"Course {course_id}" for course_id in COURSE_IDS],
+        'description': [''] * len(COURSE_IDS),
+    })
+    return CourseResponseEncoder(courses_df, version)
+
+def ranked(depth, prefix='via'):
+    """A ranked list over the test catalogue, with one explanation per course"""
+    return [(course_id, 1.0 - i / 100, [f"{prefix} {course_id}"]) for i, course_id in enumerate(COURSE_IDS[:depth])]
+
+class FakeRecommender:
+    """Just enough of HybridRecommender for the paginated endpoints"""
+    
+    def rank(self, user_id, depth, diversity=0.0):
+        return ranked(depth)
+    
+    def rank_next_courses(self, user_id, depth):
+        return ranked(depth, 'after')
+
+def test_cursor_round_trip():
+    key = ('user', 'u1', 0.0)
+    assert decode_cursor(encode_cursor(15, 3, key), 3, key) == 15
+
+def test_cursor_from_previous_version_is_stale():
+    key = ('user', 'u1', 0.0)
+    with pytest.raises(StaleCursorError):
+        decode_cursor(encode_cursor(5, 1, key), 2, key)
+
+@pytest.mark.parametrize('cursor', ['', 'bzEw', '!!!', 'MS54LjU', encode_cursor(5, 1, ('user', 'u2', 0.0))])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError) as error:
+        decode_cursor(cursor, 1, ('user', 'u1', 0.0))
+    assert not isinstance(error.value, StaleCursorError)
+
+def test_pages_cover_the_list_once():
+    cache = RankingCache(make_encoder(), depth=12)
+    seen, offset = [], 0
+    while offset is not None:
+        page, offset = cache.page('key', ranked, offset, 5)
+        seen.extend(course_id for course_id, _, _ in page)
+    assert seen == COURSE_IDS[:12]
+
+def test_last_page_boundary():
+    cache = RankingCache(make_encoder(), depth=10)
+    page, next_offset = cache.page('key', ranked, 5, 5)
+    assert [course_id for course_id, _, _ in page] == COURSE_IDS[5:10]
+    assert next_offset is None
+    
+    page, next_offset = cache.page('key', ranked, 10, 5)
+    assert page == [] and next_offset is None
+
+def test_limit_is_clamped():
+    cache = RankingCache(make_encoder(), depth=10)
+    page, next_offset = cache.page('key', ranked, 0, 0)
+    assert len(page) == 1 and next_offset == 1
+    
+    page, next_offset = cache.page('key', ranked, 0, 1000)
+    assert len(page) == 10 and next_offset is None
+
+def test_list_is_ranked_once():
+    calls = []
+    cache = RankingCache(make_encoder(), depth=10)
+    for offset in (0, 5):
+        cache.page('key', lambda depth: calls.append(depth) or ranked(depth), offset, 5)
+    assert calls == [10]
+
+def test_explanations_are_evicted_with_their_list():
+    cache = RankingCache(make_encoder(), depth=10, max_entries=2)
+    for user in range(5):
+        cache.page(user, lambda depth: ranked(depth, f"user {user}"), 0, 5)
+    
+    assert list(cache.entries) == [3, 4]
+    explanations = {value for entry in cache.entries.values() for value in entry.explanation_values}
+    assert explanations == {(f"user {user} {course_id}",) for user in (3, 4) for course_id in COURSE_IDS[:10]}
+
+@pytest.fixture
+def client():
+    # No context manager: the lifespan would start a real model build
+    encoder = make_encoder(1)
+    api.model.served = api.ServedModel(FakeRecommender(), encoder, RankingCache(encoder, depth=12), 1)
+    yield TestClient(api.app)
+    api.model.served = None
+
+def test_api_follows_cursors_to_the_end(client):
+    seen, cursor = [], None
+    while True:
+        params = {'limit': 5} if cursor is None else {'limit': 5, 'cursor': cursor}
+        body = client.get('/recommend/user/u1', params=params).json()
+        seen.extend(course['_id'] for course in body['recommendations'])
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+    assert seen == COURSE_IDS[:12]
+
+def test_api_rejects_bad_cursors_and_limits(client):
+    cursor = client.get('/recommend/user/u1', params={'limit': 5}).json()['next_cursor']
+    
+    assert client.get('/recommend/user/u1', params={'limit': -3}).status_code == 422
+    assert client.get('/recommend/user/u1', params={'cursor': 'bzEw'}).status_code == 400
+    assert client.get('/recommend/user/u2', params={'cursor': cursor}).status_code == 400
+    assert client.get('/recommend/next/u1', params={'cursor': cursor}).status_code == 400
+
+def test_api_cursor_after_refresh_is_gone(client):
+    cursor = client.get('/recommend/user/u1', params={'limit': 5}).json()['next_cursor']
+    
+    encoder = make_encoder(2)
+    api.model.served = api.ServedModel(FakeRecommender(), encoder, RankingCache(encoder, depth=12), 2)
+    assert client.get('/recommend/user/u1', params={'cursor': cursor}).status_code == 410
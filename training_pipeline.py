@@ -0,0 +1,300 @@
+import os
+import json
+import time
+import pickle
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+import pandas as pd
+from co_enrolment import CoEnrolmentIndex
+from sequence_recommender import SequenceRecommender
+
+class Stage:
+    """A named training step with explicit inputs.
+    
+    `func` receives the values of its dependencies as keyword arguments. Source
+    stages (no dependencies) always run, and their output is hashed to detect
+    data changes; every other stage is keyed by a hash of its inputs, its version
+    and its config, and is skipped when an artifact with that key already exists.
+    """
+    
+    def __init__(self, name, func, deps=(), version=1, config=None, persist=True):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.version = version
+        self.config = config or {}
+        self.persist = persist
+    
+    @property
+    def is_source(self):
+        return not self.deps
+
+class Artifact:
+    """The output of a stage.
+    
+    `key` identifies how it was produced (the hash of its inputs), `digest` what it
+    contains; dependents are keyed on the digest, so a stage that re-runs but
+    produces identical output does not invalidate anything downstream.
+    """
+    
+    def __init__(self, key, digest, value, status, seconds=0.0):
+        self.key = key
+        self.digest = digest
+        self.value = value
+        self.status = status
+        self.seconds = seconds
+
+def fingerprint(value):
+    """Content hash of a stage output or of a stage's inputs"""
+    digest = hashlib.sha1()
+    
+    if isinstance(value, pd.DataFrame):
+        digest.update(json.dumps([list(map(str, value.columns)), list(map(str, value.index[:0].names))]).encode('utf-8'))
+        if not value.empty:
+            # Stringify first: documents contain lists and dicts that pandas cannot hash directly
+            digest.update(pd.util.hash_pandas_object(value.astype(str), index=True).values.tobytes())
+    elif hasattr(value, 'tocsr'):
+        matrix = value.tocsr()
+        digest.update(repr((matrix.shape, str(matrix.dtype))).encode('utf-8'))
+        for array in (matrix.data, matrix.indices, matrix.indptr):
+            digest.update(np.ascontiguousarray(array).tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(repr((value.shape, str(value.dtype))).encode('utf-8'))
+        digest.update(np.ascontiguousarray(value).tobytes())
+    else:
+        digest.update(json.dumps(value, sort_keys=True, default=str).encode('utf-8'))
+    
+    return digest.hexdigest()
+
+class TrainingPipeline:
+    """Dependency-aware training pipeline with content-hashed, reusable artifacts.
+    
+    Stages run as soon as their inputs are ready, independent ones in parallel.
+    Artifacts are kept in memory for the lifetime of the pipeline and pickled to
+    `artifact_dir`, so a retrain in this process or a fresh one only recomputes
+    the stages whose inputs actually changed.
+    """
+    
+    def __init__(self, stages, artifact_dir=None, max_workers=4):
+        self.stages = {stage.name: stage for stage in stages}
+        self.artifact_dir = artifact_dir or os.getenv('ARTIFACT_DIR', os.path.join('cache', 'artifacts'))
+        self.max_workers = max_workers
+        self.memory = {}
+        self.report = []
+        
+        self.dependents = {stage.name: [] for stage in stages}
+        
+        for stage in stages:
+            for dep in stage.deps:
+                if dep not in self.stages:
+                    raise ValueError(f"Stage {stage.name!r} depends on unknown stage {dep!r}")
+                self.dependents[dep].append(stage.name)
+    
+    def _artifact_path(self, stage, key):
+        return os.path.join(self.artifact_dir, f"{stage.name}-{key}.pkl")
+    
+    def _stage_key(self, stage, inputs):
+        """Hash of everything that determines a derived stage's output"""
+        return fingerprint({
+            'stage': stage.name,
+            'version': stage.version,
+            'config': stage.config,
+            'inputs': {dep: inputs[dep].digest for dep in stage.deps}
+        })
+    
+    def _load(self, stage, key):
+        """Return (digest, value) of a previously built artifact, or None"""
+        cached = self.memory.get(stage.name)
+        if cached is not None and cached.key == key:
+            return cached.digest, cached.value
+        
+        if stage.persist:
+            try:
+                with open(self._artifact_path(stage, key), 'rb') as f:
+                    digest, value = pickle.load(f)
+                return digest, value
+            except Exception:
+                # Missing, truncated or otherwise unreadable artifacts are rebuilt
+                pass
+        
+        return None
+    
+    def _save(self, stage, key, digest, value):
+        os.makedirs(self.artifact_dir, exist_ok=True)
+        path = self._artifact_path(stage, key)
+        # A unique temp file per writer, so processes sharing artifact_dir never replace each other's file
+        fd, tmp_path = tempfile.mkstemp(dir=self.artifact_dir, prefix=f"{stage.name}-", suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((digest, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        
+        # Only the latest artifact of each stage is worth keeping; another process may be cleaning up too
+        prefix = f"{stage.name}-"
+        for filename in os.listdir(self.artifact_dir):
+            if filename.startswith(prefix) and filename.endswith('.pkl') and filename != os.path.basename(path):
+                try:
+                    os.remove(os.path.join(self.artifact_dir, filename))
+                except FileNotFoundError:
+                    pass
+    
+    def _run_stage(self, stage, inputs):
+        start = time.perf_counter()
+        
+        if stage.is_source:
+            value = stage.func()
+            digest = fingerprint(value)
+            return Artifact(digest, digest, value, 'loaded', time.perf_counter() - start)
+        
+        key = self._stage_key(stage, inputs)
+        cached = self._load(stage, key)
+        if cached is not None:
+            digest, value = cached
+            return Artifact(key, digest, value, 'cached', time.perf_counter() - start)
+        
+        value = stage.func(**{dep: inputs[dep].value for dep in stage.deps})
+        
+        # Hashing the output is only worth it when other stages depend on it
+        digest = fingerprint(value) if self.dependents[stage.name] else key
+        if stage.persist:
+            self._save(stage, key, digest, value)
+        return Artifact(key, digest, value, 'built', time.perf_counter() - start)
+    
+    def run(self):
+        """Run every stage whose inputs changed and return {stage name: value}"""
+        done = {}
+        running = {}
+        self.report = []
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while len(done) < len(self.stages):
+                for name, stage in self.stages.items():
+                    if name not in done and name not in running and all(dep in done for dep in stage.deps):
+                        inputs = {dep: done[dep] for dep in stage.deps}
+                        running[name] = pool.submit(self._run_stage, stage, inputs)
+                
+                if not running:
+                    raise RuntimeError("Training pipeline has a dependency cycle")
+                
+                finished, _ = wait(running.values(), return_when=FIRST_COMPLETED)
+                for name, future in list(running.items()):
+                    if future in finished:
+                        done[name] = future.result()
+                        del running[name]
+                        self.report.append((name, done[name].status, done[name].seconds))
+        
+        self.memory = done
+        return {name: artifact.value for name, artifact in done.items()}
+    
+    def summary(self):
+        """One line per stage: status and seconds, in completion order"""
+        return '\n'.join(f"{name:<20}{status:<8}{seconds:8.3f}s" for name, status, seconds in self.report)
+
+def build_recommender_pipeline(recommender, artifact_dir=None, max_workers=4):
+    """Training stages for a HybridRecommender.
+    
+    catalogue / course_versions / users are loaded once and shared. Interaction
+    and text stages only depend on the data they use, so a change to users never
+    re-runs content feature extraction, TF-IDF or content similarity. Stages that
+    only need to know which courses exist depend on `course_ids` rather than the
+    catalogue, whose `ratings` and `purchased` counters change on every purchase.
+    """
+    collaborative = recommender.collaborative_recommender
+    content = recommender.content_recommender
+    data_loader = collaborative.data_loader
+    
+    def course_versions():
+        # Courses without updatedAt cannot be fingerprinted cheaply, so force the incremental ingestor to check them
+        versions = [
+            (str(course['_id']), str(course.get('updatedAt')))
+            for course in data_loader.stream_courses(['_id', 'updatedAt'])
+        ]
+        if any(updated_at == 'None' for _, updated_at in versions):
+            versions.append(('unversioned', time.time()))
+        return sorted(versions)
+    
+    def course_ids(catalogue):
+        return list(catalogue['_id']) if not catalogue.empty else []
+    
+    def course_names(catalogue):
+        if catalogue.empty or 'name' not in catalogue.columns:
+            return {}
+        # Only used in next-course explanations, so renaming a course rebuilds nothing else
+        return {course_id: name for course_id, name in zip(catalogue['_id'], catalogue['name']) if isinstance(name, str) and name}
+    
+    def interactions(users, course_ids):
+        return collaborative.build_interaction_matrix(users, pd.DataFrame({'_id': course_ids}, columns=['_id']))
+    
+    def content_features(course_ids, course_versions):
+        # Text features only: catalogue counters are joined back in by HybridRecommender.build
+        return content.attach_content_features(pd.DataFrame({'_id': course_ids}, columns=['_id']))
+    
+    def vectorizer(content_features):
+        if content_features.empty:
+            return None
+        return content.fit_tfidf(content_features)
+    
+    def content_similarity(vectorizer):
+        if vectorizer is None:
+            return None
+        return content.compute_similarity(vectorizer)
+    
+    def co_enrolment(users, course_ids):
+        return CoEnrolmentIndex(**together_config).build(users, course_ids)
+    
+    def transitions(users, course_ids, course_names):
+        return SequenceRecommender(**sequence_config).build(users.to_dict('records'), course_ids, course_names)
+    
+    def user_similarity(interactions):
+        if interactions is None:
+            return None
+        return collaborative.compute_user_similarity(interactions)
+    
+    def item_similarity(interactions):
+        if interactions is None:
+            return None
+        return collaborative.compute_item_similarity(interactions)
+    
+    index_config = {
+        'use_vector_index': collaborative.use_vector_index,
+        'n_components': collaborative.n_components,
+        'nprobe': collaborative.nprobe,
+        'quantize': collaborative.quantize,
+    }
+    together_config = {
+        'top_k': recommender.together_top_k,
+        'min_support': recommender.together_min_support,
+    }
+    sequence_config = {
+        'completion_floor': recommender.sequence_completion_floor,
+    }
+    content_index_config = {
+        'use_vector_index': content.use_vector_index,
+        'n_components': content.n_components,
+        'nprobe': content.nprobe,
+        'quantize': content.quantize,
+    }
+    
+    stages = [
+        Stage('catalogue', data_loader.load_courses),
+        Stage('users', data_loader.load_users),
+        Stage('course_versions', course_versions),
+        Stage('course_ids', course_ids, deps=['catalogue'], persist=False),
+        Stage('course_names', course_names, deps=['catalogue'], persist=False),
+        Stage('interactions', interactions, deps=['users', 'course_ids']),
+        Stage('user_similarity', user_similarity, deps=['interactions']),
+        Stage('co_enrolment', co_enrolment, deps=['users', 'course_ids'], version=2, config=together_config),
+        Stage('transitions', transitions, deps=['users', 'course_ids', 'course_names'], config=sequence_config),
+        Stage('item_similarity', item_similarity, deps=['interactions'], config=index_config),
+        Stage('content_features', content_features, deps=['course_ids', 'course_versions'],
+              config={'extractor': content.content_ingestor.extractor_version}),
+        Stage('vectorizer', vectorizer, deps=['content_features']),
+        Stage('content_similarity', content_similarity, deps=['vectorizer'], config=content_index_config),
+    ]
+    
+    return TrainingPipeline(stages, artifact_dir, max_workers)
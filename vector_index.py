@@ -0,0 +1,163 @@
+import numpy as np
+
+class SVDEmbedder:
+    """Compress sparse TF-IDF or interaction rows into dense, L2-normalised float32 embeddings.
+    
+    Cosine similarity between the embeddings is a plain dot product, which is
+    what the IVF index below relies on.
+    """
+    
+    def __init__(self, n_components=64, random_state=42):
+        self.n_components = n_components
+        self.random_state = random_state
+        self.svd = None
+    
+    def fit_transform(self, matrix):
+        """Fit truncated SVD on the matrix (rows are items) and return normalised embeddings"""
+        n_samples, n_features = matrix.shape
+        n_components = min(self.n_components, n_samples - 1, n_features - 1)
+        
+        if n_components >= 1:
+            # Imported lazily, the index is optional and sklearn.decomposition is slow to import
+            from sklearn.decomposition import TruncatedSVD
+            
+            self.svd = TruncatedSVD(n_components=n_components, random_state=self.random_state)
+            vectors = self.svd.fit_transform(matrix)
+        else:
+            # Too small to decompose, keep the raw rows
+            self.svd = None
+            vectors = matrix.toarray() if hasattr(matrix, 'toarray') else np.asarray(matrix)
+        
+        return normalize_rows(np.asarray(vectors, dtype=np.float32))
+    
+    def transform(self, matrix):
+        """Project new rows into the fitted embedding space"""
+        if self.svd is None:
+            vectors = matrix.toarray() if hasattr(matrix, 'toarray') else np.asarray(matrix)
+        else:
+            vectors = self.svd.transform(matrix)
+        
+        return normalize_rows(np.asarray(vectors, dtype=np.float32))
+
+def normalize_rows(vectors):
+    """L2-normalise each row, leaving all-zero rows untouched"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+def quantize_int8(vectors):
+    """Symmetric per-row int8 quantisation, returns (codes, scales) with vectors ~= codes * scales"""
+    max_abs = np.abs(vectors).max(axis=1, keepdims=True)
+    scales = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+    codes = np.clip(np.rint(vectors / scales), -127, 127).astype(np.int8)
+    return codes, scales.ravel()
+
+class IVFIndex:
+    """Inverted-file approximate nearest-neighbour index over normalised embeddings.
+    
+    Vectors are partitioned with k-means into `n_lists` cells. A query scores the
+    centroids, then only the vectors in the `nprobe` closest cells. Setting
+    `nprobe = n_lists` gives exact search; lower values trade recall for latency.
+    """
+    
+    def __init__(self, n_lists=None, nprobe=4, quantize=False, n_iter=20, random_state=42):
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.quantize = quantize
+        self.n_iter = n_iter
+        self.random_state = random_state
+        
+        self.centroids = None
+        self.list_offsets = None
+        self.ids = None
+        self.vectors = None
+        self.codes = None
+        self.scales = None
+    
+    def _kmeans(self, vectors, n_lists):
+        """Spherical k-means with random initialisation, returns (centroids, assignments)"""
+        rng = np.random.default_rng(self.random_state)
+        centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+        assignments = np.zeros(len(vectors), dtype=np.int64)
+        
+        for iteration in range(self.n_iter):
+            new_assignments = np.argmax(vectors @ centroids.T, axis=1)
+            if iteration > 0 and np.array_equal(new_assignments, assignments):
+                break
+            assignments = new_assignments
+            
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, vectors)
+            counts = np.bincount(assignments, minlength=n_lists)
+            
+            # Re-seed empty cells with random points so every list stays usable
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+            
+            centroids = normalize_rows(sums)
+        
+        return centroids, assignments
+    
+    def build(self, vectors):
+        """Partition the (n_items, dim) float32 vectors into inverted lists"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n_items = len(vectors)
+        n_lists = self.n_lists or max(1, int(np.sqrt(n_items)))
+        n_lists = max(1, min(n_lists, n_items))
+        
+        self.centroids, assignments = self._kmeans(vectors, n_lists)
+        
+        # Store vectors grouped by list (CSR-style) so probing a cell is a contiguous slice
+        order = np.argsort(assignments, kind='stable')
+        self.ids = order
+        self.list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=n_lists))])
+        
+        if self.quantize:
+            self.codes, self.scales = quantize_int8(vectors[order])
+            self.vectors = None
+        else:
+            self.vectors = vectors[order]
+            self.codes = self.scales = None
+        
+        return self
+    
+    def search(self, query, k=10, nprobe=None, exclude=None):
+        """Return (ids, scores) of the k most similar indexed vectors to a single query vector"""
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        query = np.asarray(query, dtype=np.float32).ravel()
+        
+        # Pick the closest cells
+        centroid_scores = self.centroids @ query
+        if nprobe < len(centroid_scores):
+            probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            probe = np.arange(len(centroid_scores))
+        
+        positions = np.concatenate([np.arange(self.list_offsets[c], self.list_offsets[c + 1]) for c in probe])
+        if len(positions) == 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+        
+        if self.quantize:
+            scores = (self.codes[positions].astype(np.float32) @ query) * self.scales[positions]
+        else:
+            scores = self.vectors[positions] @ query
+        
+        candidate_ids = self.ids[positions]
+        if exclude is not None:
+            keep = ~np.isin(candidate_ids, exclude)
+            candidate_ids, scores = candidate_ids[keep], scores[keep]
+        
+        k = min(k, len(scores))
+        if k == 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+        
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return candidate_ids[top], scores[top]
+    
+    def memory_bytes(self):
+        """Approximate size of the stored vectors"""
+        if self.quantize:
+            return self.codes.nbytes + self.scales.nbytes
+        return self.vectors.nbytes